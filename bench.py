@@ -0,0 +1,232 @@
+import os
+import sys
+import time
+import json
+import tempfile
+import tracemalloc
+import argparse
+
+# Замеры производительности без окна и звука:
+#     python bench.py [--frames N] [--scenario NAME ...] [--dirty-rects]
+#                     [--renderer texture [--scale N]] [--json FILE]
+# Каждый сценарий — заскриптованный ввод на N кадров (после проигрыша забег
+# начинается заново со следующим сидом). Обновление мира и отрисовка меряются
+# отдельно, затем тот же прогон повторяется под tracemalloc. Сохранения пишутся
+# во временный каталог, настоящий прогресс игрока не трогается. Текстурный
+# вывод без видеокарты меряется с SDL_RENDER_DRIVER=software.
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+_bench_home = tempfile.mkdtemp(prefix="pixel_hopper_bench_")
+os.environ["HOME"] = _bench_home
+os.environ["USERPROFILE"] = _bench_home
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import pygame
+import main_pk as game
+
+
+def follow_platforms():
+    # Прыгает с земли и подруливает к ближайшей платформе выше той, с которой прыгнул
+    state = {"floor": None}
+
+    def policy(world, frame):
+        player = world.player
+        cam = world.camera_offset
+        if player.on_ground or state["floor"] is None:
+            state["floor"] = player.rect.bottom + cam
+        floor = state["floor"] - cam
+        above = [p for p in world.platforms if p.rect.top < floor - 10]
+        target = max(above, key=lambda p: p.rect.top) if above else None
+        left = right = False
+        if target is not None:
+            if player.rect.centerx < target.rect.centerx - 8:
+                right = True
+            elif player.rect.centerx > target.rect.centerx + 8:
+                left = True
+        return game.FrameInput(left=left, right=right, jump=player.on_ground)
+    return policy
+
+
+def jump_drift():
+    # Прыжок зажат всегда, снос вправо с короткими возвратами влево
+    def policy(world, frame):
+        left = frame % 120 >= 80
+        return game.FrameInput(left=left, right=not left, jump=True)
+    return policy
+
+
+def fall_then_follow(fall_frames=150):
+    # Сначала уходит с платформы влево, чтобы сработала вторая жизнь, потом играет
+    follow = follow_platforms()
+
+    def policy(world, frame):
+        if world.frame < fall_frames:
+            return game.FrameInput(left=True)
+        return follow(world, frame)
+    return policy
+
+
+# имя: (политика, настройки глобальных переменных игры, аргументы GameWorld)
+SCENARIOS = {
+    "jump_drift": (jump_drift, {"current_trail": "red"}, {}),
+    "helicopter": (follow_platforms, {"HELICOPTER_CHANCE": 0.5, "current_trail": "blue"}, {}),
+    "rainbow_revive": (fall_then_follow, {"current_trail": "rainbow", "double_life": True}, {"extra_life": True}),
+}
+
+
+class Scenario:
+    def __init__(self, name):
+        self.name = name
+        self.make_policy, self.settings, self.world_kwargs = SCENARIOS[name]
+        self.saved = {}
+
+    def __enter__(self):
+        for key, value in self.settings.items():
+            self.saved[key] = getattr(game, key)
+            setattr(game, key, value)
+        return self
+
+    def __exit__(self, *exc):
+        for key, value in self.saved.items():
+            setattr(game, key, value)
+
+    def worlds(self):
+        seed = 1
+        while True:
+            yield game.GameWorld(seed=seed, **self.world_kwargs), self.make_policy()
+            seed += 1
+
+
+def run_frames(scenario, frames, renderer=None, trace=False):
+    # Возвращает время update, время render, пиковые временные выделения на кадр
+    # и число забегов/поездок/воскрешений, чтобы видеть, что сценарий сработал
+    screen = game.screen
+    background = game.load_background(0)
+    font = game.get_font(20, bold=True)
+    update_time = render_time = 0.0
+    alloc_peak = alloc_total = 0
+    runs = rides = revives = 0
+    worlds = scenario.worlds()
+    world, policy = next(worlds)
+    runs += 1
+    was_lifting = was_reviving = False
+    for frame in range(frames):
+        if trace:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        world.step(policy(world, frame))
+        t1 = time.perf_counter()
+        if world.lift_active and not was_lifting:
+            rides += 1
+        if world.revive_active and not was_reviving:
+            revives += 1
+        was_lifting, was_reviving = world.lift_active, world.revive_active
+        if world.game_over:
+            world.release_entities()
+            game.reset_game_state()
+            world, policy = next(worlds)
+            runs += 1
+            if renderer is not None:
+                renderer.invalidate()
+            t1 = time.perf_counter()
+        elif renderer is not None:
+            renderer.present(screen, background, world, font)
+        else:
+            target = game.backend.begin_frame()
+            target.blit(background, (0, 0))
+            game.draw_world(target, world, font, track=False)
+            game.draw_hud(target, world)
+            game.backend.end_frame()
+        t2 = time.perf_counter()
+        update_time += t1 - t0
+        render_time += t2 - t1
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1] - base
+            alloc_total += peak
+            alloc_peak = max(alloc_peak, peak)
+    world.release_entities()
+    game.flush_saves()
+    return {"update_s": update_time, "render_s": render_time,
+            "alloc_avg": alloc_total / frames, "alloc_max": alloc_peak,
+            "runs": runs, "rides": rides, "revives": revives}
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В macOS ru_maxrss в байтах, в Linux — в килобайтах
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def bench(name, frames, dirty_rects=False):
+    with Scenario(name) as scenario:
+        renderer = game.DirtyRectRenderer() if dirty_rects else None
+        timed = run_frames(scenario, frames, renderer)
+        tracemalloc.start()
+        traced = run_frames(scenario, frames, renderer, trace=True)
+        tracemalloc.stop()
+    return {
+        "scenario": name,
+        "renderer": game.backend.name,
+        "frames": frames,
+        "update_fps": frames / timed["update_s"] if timed["update_s"] else 0.0,
+        "render_fps": frames / timed["render_s"] if timed["render_s"] else 0.0,
+        "total_fps": frames / (timed["update_s"] + timed["render_s"]),
+        "alloc_bytes_per_frame": traced["alloc_avg"],
+        "alloc_bytes_max": traced["alloc_max"],
+        "peak_rss_kb": peak_rss_kb(),
+        "runs": timed["runs"],
+        "helicopter_rides": timed["rides"],
+        "revives": timed["revives"],
+        # Пулы, кэш текста и картинок после обоих прогонов сценария
+        "caches": game.cache_stats(renderer),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры Pixel Hopper Pro без окна")
+    parser.add_argument("--frames", type=int, default=3000, help="кадров на сценарий")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="запустить только этот сценарий (можно несколько раз)")
+    parser.add_argument("--dirty-rects", action="store_true", help="рисовать через DirtyRectRenderer")
+    parser.add_argument("--renderer", choices=game.RENDERERS, default="software", help="вывод кадров")
+    parser.add_argument("--scale", type=int, default=1, help="увеличение окна для --renderer texture")
+    parser.add_argument("--json", metavar="FILE", help="записать результаты в JSON")
+    args = parser.parse_args()
+
+    game.setup_window(args.renderer, args.scale)
+    if args.dirty_rects and game.backend.name != "software":
+        parser.error("--dirty-rects работает только с программным выводом")
+    # Музыку не запускаем: reset_game_state() включает ее при каждом новом забеге
+    game.sound_enabled = False
+    results = [bench(name, args.frames, args.dirty_rects) for name in (args.scenario or SCENARIOS)]
+
+    print(f"вывод: {game.backend.name}")
+    print(f"{'сценарий':<16}{'update fps':>12}{'render fps':>12}{'всего fps':>11}"
+          f"{'КБ/кадр':>9}{'RSS МБ':>8}  забеги/вертолет/воскрешения")
+    for r in results:
+        rss = f"{r['peak_rss_kb'] / 1024:.1f}" if r["peak_rss_kb"] is not None else "-"
+        print(f"{r['scenario']:<16}{r['update_fps']:>12.0f}{r['render_fps']:>12.0f}{r['total_fps']:>11.0f}"
+              f"{r['alloc_bytes_per_frame'] / 1024:>9.1f}{rss:>8}  "
+              f"{r['runs']}/{r['helicopter_rides']}/{r['revives']}")
+        if "dirty_rects" in r["caches"]:
+            frames = r["caches"]["dirty_rects"]
+            print(f"{'':<16}кадры: полных {frames['full']}, частичных {frames['partial']}")
+    # Кэши общие для процесса, поэтому сводка после последнего сценария
+    for line in game.cache_stats_lines():
+        print(line)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    pygame.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+
+# Сборка пакета картинок для быстрого старта игры:
+#     python build_assets.py
+# Фоны масштабируются до 400x600, скины (файлы из assets/ или нарисованные
+# в коде) запекаются в 32x32, и все пиксели пишутся несжатыми в assets.bundle,
+# который игра отображает в память. Если исходник изменится, игра заметит это
+# по размеру и времени изменения и загрузит его по-старому.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import main_pk as game
+
+BACKGROUND_IMAGES = game.BACKGROUNDS + ["store_background.jpg", "background_home_screen.jpg"]
+
+
+def collect_backgrounds():
+    items = []
+    size = (game.WIDTH, game.HEIGHT)
+    for name in BACKGROUND_IMAGES:
+        try:
+            image = game.assets._decode(name, size)
+        except Exception as e:
+            print(f"Пропуск {name}: {e}")
+            continue
+        sources = {name: game.source_stamp(game.GAME_DIR / name)}
+        items.append((game.bundle_key(name, size), image, "RGB", sources))
+    return items
+
+
+def collect_skins():
+    items = []
+    size = (game.PLAYER_SIZE, game.PLAYER_SIZE)
+    for name, filename in game.SKIN_FILES.items():
+        sources = {}
+        if filename is not None:
+            rel = f"assets/{filename}"
+            sources[rel] = game.source_stamp(game.GAME_DIR / rel)
+        items.append((game.bundle_key(f"skin:{name}", size), game.skin_registry.build(name), "RGBA", sources))
+    return items
+
+
+def main():
+    # convert_alpha() в загрузке скинов требует окна
+    pygame.display.set_mode((1, 1))
+    start = time.perf_counter()
+    items = collect_backgrounds() + collect_skins()
+    path = game.GAME_DIR / game.BUNDLE_FILE
+    size = game.AssetBundle.write(path, items)
+    elapsed = time.perf_counter() - start
+    print(f"{path}: {len(items)} картинок, {size // 1024} КБ, {elapsed:.2f} с")
+    pygame.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
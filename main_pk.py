@@ -5,13 +5,28 @@ import sys
 import json
 import atexit
 import os
+import threading
+import weakref
 from pathlib import Path
 import colorsys
 import math
-
-# Инициализация Pygame
+import base64
+import hashlib
+import zlib
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+from collections import deque, OrderedDict
+from datetime import datetime
+
+try:
+    from pygame._sdl2 import video as sdl2_video
+except ImportError:  # pygame без _sdl2: доступен только программный вывод
+    sdl2_video = None
+
+# Инициализация Pygame (окно и звук создаются в setup_window, чтобы симуляцию можно было запускать без дисплея)
 pygame.init()
-pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
 
 # Константы
 WIDTH, HEIGHT = 400, 600
@@ -22,6 +37,7 @@ PLATFORM_WIDTH = 80
 PLATFORM_HEIGHT = 20
 COIN_SIZE = 16
 FPS = 90
+SIM_DT = 1.0 / FPS  # фиксированный шаг симуляции
 PLATFORM_GAP = 100
 PLAYER_SPEED = 6
 INITIAL_JUMP_DELAY = 1.5
@@ -41,6 +57,25 @@ SPRING_COLOR = (100, 255, 100)
 SAVE_DIR = Path.home() / ".pixel_hopper_pro"
 SAVE_DIR.mkdir(exist_ok=True)
 SAVE_FILE = SAVE_DIR / "game_data.json"
+SAVE_BACKUP_FILE = SAVE_DIR / "game_data.json.bak"
+JOURNAL_FILE = SAVE_DIR / "game_data.journal"
+SAVE_VERSION = 2
+SAVE_INTERVAL = 1.0  # не чаще одной записи на диск в секунду
+JOURNAL_COMPACT_ENTRIES = 100
+SAVE_DEFAULTS = {
+    "high_score": 0,
+    "sound_enabled": True,
+    "max_platforms": 0,
+    "total_coins": 0,
+    "current_skin": "default",
+    "current_trail": "none",
+    "purchased_skins": ["default"],
+    "purchased_trails": ["none"],
+    "double_coins": False,
+    "double_life": False
+}
+REPLAY_DIR = SAVE_DIR / "replays"
+MAX_REPLAYS = 10
 
 # Глобальные переменные
 current_score = 0
@@ -51,8 +86,6 @@ max_platforms = 0
 total_coins = 0  # Initialize to 0, will be loaded from save
 sound_enabled = True
 music_loaded = False
-coins = []
-floating_texts = []
 current_trail = "none"
 current_skin = "default"
 purchased_skins = ["default"]
@@ -76,10 +109,6 @@ HELI_LIFETIME_PLATFORMS = 25
 BLINK_THRESHOLD_PLATFORMS = 5
 HELI_BLINK_BEFORE_VANISH_SEC = 3
 HELI_SCROLL_PX_PER_SEC = 150
-helicopters = []
-lift_active = False
-lift_remaining = 0
-helicopter_carry = None
 
 # Локализация отображаемых названий предметов
 NAME_MAP = {
@@ -96,59 +125,431 @@ NAME_MAP = {
 def display_name(name):
     return NAME_MAP.get(name, name)
 
-# Настройка экрана
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Pixel Hopper Pro")
+# Шрифты и отрисованные строки
+_fonts = {}
+
+
+def get_font(size, bold=False, name="Arial"):
+    # SysFont ищет шрифт среди всех установленных, поэтому каждый размер разрешаем один раз
+    key = (name, size, bold)
+    font = _fonts.get(key)
+    if font is None:
+        font = pygame.font.SysFont(name, size, bold=bold)
+        _fonts[key] = font
+    return font
+
+
+class TextCache:
+    # LRU-кэш поверхностей текста по (шрифт, строка, цвет)
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surf = self.entries.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return surf
+        self.misses += 1
+        surf = font.render(text, True, color)
+        self.entries[key] = surf
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surf
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+text_cache = TextCache()
+
+
+def render_text(font, text, color):
+    return text_cache.render(font, text, color)
+
+
+# Картинки ищем рядом с игрой, а не в текущем каталоге
+if getattr(sys, 'frozen', False):
+    GAME_DIR = Path(sys.executable).parent
+else:
+    GAME_DIR = Path(__file__).parent
+
+# Пакет предобработанных картинок (собирается build_assets.py)
+BUNDLE_FILE = "assets.bundle"
+BUNDLE_MAGIC = b"PHB1"
+
+# Скины и их необязательные файлы в assets/
+SKIN_FILES = {
+    "default": None,
+    "ninja": "ninja.png",
+    "robot": "robot.png",
+    "zombie": "zombie.png"
+}
+
+# Следующий фон начинаем декодировать за столько прыжков до порога
+BACKGROUND_THRESHOLDS = [(100, 2), (40, 1)]
+BACKGROUND_PREFETCH_JUMPS = 10
+
+
+def bundle_key(path, size):
+    return f"{path}@{size[0]}x{size[1]}"
+
+
+def source_stamp(path):
+    # Размер и время изменения исходника; None, если файла нет
+    try:
+        st = Path(path).stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class AssetBundle:
+    # Несжатые пиксели, уже приведенные к нужному размеру. Файл отображается
+    # в память, и поверхности строятся прямо поверх него через frombuffer.
+    # Формат: BUNDLE_MAGIC, длина заголовка (uint32), JSON-заголовок, данные.
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = None
+        self.map = None
+        self.view = None
+
+    def _open(self):
+        self.entries = {}
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "rb") as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.map[:4] != BUNDLE_MAGIC:
+                raise ValueError("неизвестный формат")
+            (header_len,) = struct.unpack_from("<I", self.map, 4)
+            header = json.loads(self.map[8:8 + header_len].decode("utf-8"))
+            # Смещения в заголовке отсчитываются от начала данных
+            self.view = memoryview(self.map)[8 + header_len:]
+            self.entries = header["entries"]
+        except Exception as e:
+            print(f"Ошибка чтения пакета ресурсов: {e}")
+            self.entries = {}
+
+    def _fresh(self, entry):
+        # Запись устарела, если исходник с тех пор изменился, появился или пропал
+        base = self.path.parent
+        return all(source_stamp(base / rel) == stamp for rel, stamp in entry["sources"].items())
+
+    def surface(self, name):
+        if self.entries is None:
+            self._open()
+        entry = self.entries.get(name)
+        if entry is None or not self._fresh(entry):
+            return None
+        start = entry["offset"]
+        data = self.view[start:start + entry["length"]]
+        return pygame.image.frombuffer(data, tuple(entry["size"]), entry["format"])
+
+    @staticmethod
+    def write(path, items):
+        # items: (имя, поверхность, "RGB"/"RGBA", {исходник: отметка})
+        to_bytes = getattr(pygame.image, "tobytes", None) or pygame.image.tostring
+        entries = {}
+        blobs = []
+        offset = 0
+        for name, surf, fmt, sources in items:
+            data = to_bytes(surf, fmt)
+            entries[name] = {"size": list(surf.get_size()), "format": fmt,
+                             "offset": offset, "length": len(data), "sources": sources}
+            blobs.append(data)
+            offset += len(data)
+        header = json.dumps({"entries": entries}).encode("utf-8")
+        tmp = Path(str(path) + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(BUNDLE_MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for data in blobs:
+                f.write(data)
+        os.replace(tmp, path)
+        return offset
+
+
+def maybe_convert(surface, alpha=True):
+    # Приводит поверхность к формату экрана; без окна (безголовый прогон) convert() недоступен
+    if pygame.display.get_surface() is None:
+        return surface
+    return surface.convert_alpha() if alpha else surface.convert()
+
+
+class AssetManager:
+    # Общий кэш картинок по (путь, размер): каждая декодируется, масштабируется
+    # и приводится к формату экрана один раз. Декодирование и масштабирование
+    # можно заранее выполнить в фоновом потоке, convert() делается в главном.
+    # Сначала смотрим в пакет build_assets.py: там картинки уже декодированы.
+    def __init__(self, base_dir):
+        self.base_dir = Path(base_dir)
+        self.bundle = AssetBundle(self.base_dir / BUNDLE_FILE)
+        self.surfaces = {}
+        self.pending = {}
+        # Найденные при prefetch в пакете, но еще не приведенные к формату экрана
+        self.ready = {}
+        self.lock = threading.Lock()
+        self.executor = None
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.bundled = 0
+
+    def _bundled(self, path, size):
+        if size is None:
+            return None
+        return self.bundle.surface(bundle_key(path, size))
+
+    def _decode(self, path, size):
+        image = pygame.image.load(str(self.base_dir / path))
+        if size is not None and image.get_size() != tuple(size):
+            image = pygame.transform.scale(image, size)
+        return image
+
+    def prefetch(self, path, size=(WIDTH, HEIGHT), alpha=False):
+        key = (path, size, alpha)
+        with self.lock:
+            # prefetch зовется на каждом прыжке в окне перед сменой фона: повторные вызовы ничего не делают
+            if key in self.surfaces or key in self.pending or key in self.ready:
+                return
+            image = self._bundled(path, size)
+            if image is not None:
+                self.ready[key] = image
+                return
+            if self.executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="assets")
+            self.pending[key] = self.executor.submit(self._decode, path, size)
+
+    def get(self, path, size=(WIDTH, HEIGHT), alpha=False, fallback=None):
+        key = (path, size, alpha)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            return surf
+        self.misses += 1
+        with self.lock:
+            future = self.pending.pop(key, None)
+            image = self.ready.pop(key, None)
+        try:
+            if image is None and future is None:
+                image = self._bundled(path, size)
+            if image is not None:
+                self.bundled += 1
+            elif future is not None:
+                image = future.result()
+                self.prefetched += 1
+            else:
+                image = self._decode(path, size)
+            surf = maybe_convert(image, alpha)
+        except Exception as e:
+            if fallback is None:
+                raise
+            print(f"Ошибка загрузки {path}: {e}")
+            surf = pygame.Surface(size if size is not None else (WIDTH, HEIGHT))
+            surf.fill(fallback)
+            surf = maybe_convert(surf, alpha)
+        self.surfaces[key] = surf
+        return surf
+
+    def stats(self):
+        memory = sum(s.get_pitch() * s.get_height() for s in self.surfaces.values())
+        return {"entries": len(self.surfaces), "hits": self.hits, "misses": self.misses,
+                "prefetched": self.prefetched, "bundled": self.bundled, "pending": len(self.pending), "bytes": memory}
+
+
+assets = AssetManager(GAME_DIR)
+
+
+# Настройка экрана. На screen рисуют меню; backend выводит кадры в окно
+screen = None
+backend = None
 clock = pygame.time.Clock()
+RENDERERS = ("software", "texture")
 
-class Player:
-    def __init__(self):
-        self.game_dir = self._get_game_directory()
-        self.current_skin = current_skin
-        self.skins = {
-            "default": None,
-            "ninja": None,
-            "robot": None,
-            "zombie": None
-        }
-        self._load_all_skins()
-        self.reset()
-        self.trail_points = []
-        self.trail_colors = {
-            "none": None,
-            "red": (255, 100, 100),
-            "blue": (100, 100, 255),
-            "rainbow": None
-        }
-        self.trail_update_delay = 0.02
-        self.last_trail_update = 0
-        self.facing_right = True
-        self.animation_frame = 0
-        self.current_trail = current_trail
+def setup_window(renderer="software", scale=1):
+    global screen, backend
+    pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
+    backend = None
+    if renderer == "texture":
+        try:
+            backend = TextureBackend(scale)
+        except Exception as e:
+            print(f"Ошибка текстурного вывода, используется программный: {e}")
+    if backend is None:
+        backend = SoftwareBackend()
+    screen = backend.surface
+    return screen
+
+def shift_y(rect, dy):
+    # Rect округляет половины от нуля, и в отрицательных мировых координатах
+    # физика шла бы иначе; округляем половины вверх независимо от знака
+    rect.y = math.floor(rect.y + dy + 0.5)
+
+
+TRAIL_COLORS = {
+    "none": None,
+    "red": (255, 100, 100),
+    "blue": (100, 100, 255),
+    "rainbow": None
+}
 
-    def _get_game_directory(self):
-        if getattr(sys, 'frozen', False):
-            return Path(sys.executable).parent
-        else:
-            return Path(__file__).parent
 
-    def _load_all_skins(self):
-        self.skins["default"] = self._create_default_sprite()
-        self.skins["ninja"] = self._load_skin("ninja.png", self._create_ninja_sprite)
-        self.skins["robot"] = self._load_skin("robot.png", self._create_robot_sprite)
-        self.skins["zombie"] = self._load_skin("zombie.png", self._create_zombie_sprite)
+# Длина следа в точках; премиальные следы могут быть длиннее
+TRAIL_MAX_POINTS = 50
+TRAIL_LENGTHS = {
+    "red": TRAIL_MAX_POINTS,
+    "blue": TRAIL_MAX_POINTS,
+    "rainbow": TRAIL_MAX_POINTS
+}
+_trail_color_tables = {}
+
+
+def trail_color_table(trail, count):
+    # Таблица RGBA по индексу точки следа; строится один раз на (след, длина)
+    key = (trail, count)
+    table = _trail_color_tables.get(key)
+    if table is None:
+        table = [None]
+        for i in range(1, count):
+            progress = i / count
+            alpha = int(220 * (1 - progress))
+            if trail == "rainbow":
+                hue = progress % 1
+                table.append((*[int(c*255) for c in colorsys.hsv_to_rgb(hue, 0.9, 1)], alpha))
+            else:
+                table.append((*TRAIL_COLORS[trail], alpha))
+        _trail_color_tables[key] = table
+    return table
+
+
+class TrailBuffer:
+    # Кольцевой буфер точек следа фиксированной емкости (колонки x/y);
+    # затухание зависит от номера точки, время появления не хранится
+    def __init__(self, capacity=TRAIL_MAX_POINTS):
+        self.capacity = max(1, capacity)
+        self.xs = array('i', bytes(4 * self.capacity))
+        self.ys = array('i', bytes(4 * self.capacity))
+        self.head = -1
+        self.count = 0
+
+    def __len__(self):
+        return self.count
 
-    def _load_skin(self, filename, fallback_func):
-        skin_path = self.game_dir / "assets" / filename
+    def push(self, x, y):
+        self.head = (self.head + 1) % self.capacity
+        self.xs[self.head] = x
+        self.ys[self.head] = y
+        if self.count < self.capacity:
+            self.count += 1
+
+
+# Поверхности, которые перерисовываются на месте: текстурный вывод
+# догружает их в текстуру при каждой отрисовке, а не один раз
+streaming_surfaces = weakref.WeakSet()
+
+
+class TrailRenderer:
+    # Постоянный прозрачный слой для следа: каждый кадр очищается и
+    # переносится на экран только прямоугольник, занятый сегментами
+    def __init__(self):
+        self.layer = None
+        self.dirty = None
+
+    def draw(self, surface, trail, points, camera_y=0):
+        # points — TrailBuffer, обходим от новой точки к старой
+        if self.layer is None or self.layer.get_size() != surface.get_size():
+            self.layer = pygame.Surface(surface.get_size(), pygame.SRCALPHA)
+            streaming_surfaces.add(self.layer)
+            self.dirty = None
+        layer = self.layer
+        if self.dirty is not None:
+            layer.fill((0, 0, 0, 0), self.dirty)
+        count = len(points)
+        colors = trail_color_table(trail, count)
+        xs, ys, capacity, y_offset = points.xs, points.ys, points.capacity, camera_y
+        idx = points.head
+        prev = (xs[idx], ys[idx] + y_offset)
+        dirty = None
+        for i in range(1, count):
+            idx = (idx - 1) % capacity
+            point = (xs[idx], ys[idx] + y_offset)
+            r = pygame.draw.line(layer, colors[i], prev, point, 12)
+            prev = point
+            if r.width and r.height:
+                if dirty is None:
+                    dirty = r
+                else:
+                    dirty.union_ip(r)
+        self.dirty = dirty
+        if dirty is not None:
+            return surface.blit(layer, dirty, dirty)
+        return None
+
+trail_renderer = TrailRenderer()
+
+
+class SkinRegistry:
+    # Скины для всех Player сразу в обеих ориентациях (вправо, влево).
+    # Строятся один раз; пересобираются, только если изменилась папка assets.
+    def __init__(self, base_dir):
+        self.assets_dir = Path(base_dir) / "assets"
+        self.skins = None
+        self.stamp = None
+
+    def _stamp(self):
+        files = [source_stamp(self.assets_dir / f) for f in SKIN_FILES.values() if f]
+        return (source_stamp(self.assets_dir), files)
+
+    def load(self):
+        stamp = self._stamp()
+        if self.skins is None or stamp != self.stamp:
+            self.skins = {}
+            for name in SKIN_FILES:
+                skin = assets.bundle.surface(bundle_key(f"skin:{name}", (PLAYER_SIZE, PLAYER_SIZE)))
+                skin = skin.convert_alpha() if skin is not None else self.build(name)
+                self.skins[name] = (skin, pygame.transform.flip(skin, True, False))
+            self.stamp = stamp
+        return self.skins
+
+    def build(self, name):
+        create = getattr(Player, f"_create_{name}_sprite")
+        filename = SKIN_FILES[name]
+        if filename is None:
+            return create()
+        skin_path = self.assets_dir / filename
         if skin_path.exists():
             try:
                 img = pygame.image.load(str(skin_path)).convert_alpha()
                 return pygame.transform.scale(img, (PLAYER_SIZE, PLAYER_SIZE))
             except Exception as e:
                 print(f"Ошибка загрузки {filename}: {e}")
-        return fallback_func()
+        return create()
+
+
+skin_registry = SkinRegistry(GAME_DIR)
+
+
+class Player:
+    def __init__(self, load_skins=True):
+        self.current_skin = current_skin
+        # Скины общие для всех игроков; в безголовом режиме спрайты не нужны
+        self.skins = skin_registry.load() if load_skins else {}
+        self.current_trail = current_trail
+        self.reset()
+        self.trail_update_delay = 0.02
+        self.facing_right = True
+        self.animation_frame = 0
 
-    def _create_default_sprite(self):
+    @staticmethod
+    def _create_default_sprite():
         surface = pygame.Surface((PLAYER_SIZE, PLAYER_SIZE), pygame.SRCALPHA)
         pygame.draw.rect(surface, (40, 200, 40), (0, 0, PLAYER_SIZE, PLAYER_SIZE))
         pygame.draw.circle(surface, WHITE, (PLAYER_SIZE//3, PLAYER_SIZE//3), 6)
@@ -158,7 +559,8 @@ class Player:
         pygame.draw.arc(surface, BLACK, (PLAYER_SIZE//4, 2*PLAYER_SIZE//3, PLAYER_SIZE//2, 10), 3.5, 6.0, 2)
         return surface
 
-    def _create_ninja_sprite(self):
+    @staticmethod
+    def _create_ninja_sprite():
         surface = pygame.Surface((PLAYER_SIZE, PLAYER_SIZE), pygame.SRCALPHA)
         # Тело
         pygame.draw.rect(surface, (40, 40, 40), (8, 10, 16, 22))
@@ -181,7 +583,8 @@ class Player:
         pygame.draw.polygon(surface, (200, 200, 200), [(6, 12), (2, 16), (6, 16)])
         return surface
 
-    def _create_robot_sprite(self):
+    @staticmethod
+    def _create_robot_sprite():
         surface = pygame.Surface((PLAYER_SIZE, PLAYER_SIZE), pygame.SRCALPHA)
         # Корпус
         pygame.draw.rect(surface, (150, 150, 150), (8, 8, 16, 20), border_radius=3)
@@ -208,7 +611,8 @@ class Player:
         pygame.draw.rect(surface, (200, 200, 200), (22, 20, 4, 2))
         return surface
 
-    def _create_zombie_sprite(self):
+    @staticmethod
+    def _create_zombie_sprite():
         surface = pygame.Surface((PLAYER_SIZE, PLAYER_SIZE), pygame.SRCALPHA)
         # Тело
         pygame.draw.rect(surface, (80, 120, 80), (8, 10, 16, 20))
@@ -235,57 +639,48 @@ class Player:
         pygame.draw.line(surface, (150, 0, 0), (8, 18), (10, 20), 2)
         return surface
 
-    def reset(self):
+    def reset(self, now=0.0):
         self.rect = pygame.Rect(WIDTH // 2 - PLAYER_SIZE // 2, HEIGHT - 150, PLAYER_SIZE, PLAYER_SIZE)
         self.velocity_y = 0
         self.velocity_x = 0
         self.on_ground = True
         self.old_y = 0
         self.old_x = 0
-        self.game_start_time = time.time()
+        self.game_start_time = now
         self.initial_jump_available = True
         self.jump_count = 0
         self.last_save_score = 0
-        self.trail_points = []
-        self.last_trail_update = 0
+        self.trail_points = TrailBuffer(TRAIL_LENGTHS.get(self.current_trail, TRAIL_MAX_POINTS))
+        self.last_trail_update = -1.0
 
-    def draw(self, surface):
+    def draw(self, surface, camera_y=0):
+        trail_rect = None
         if self.current_trail != "none" and len(self.trail_points) > 1:
-            trail_surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-            for i in range(1, len(self.trail_points)):
-                progress = i / len(self.trail_points)
-                alpha = int(220 * (1 - progress))
-                if self.current_trail == "rainbow":
-                    hue = progress % 1
-                    color = (*[int(c*255) for c in colorsys.hsv_to_rgb(hue, 0.9, 1)], alpha)
-                else:
-                    base_color = self.trail_colors[self.current_trail]
-                    color = (*base_color, alpha)
-                start_pos = (self.trail_points[i-1]["x"], self.trail_points[i-1]["y"])
-                end_pos = (self.trail_points[i]["x"], self.trail_points[i]["y"])
-                pygame.draw.line(trail_surface, color, start_pos, end_pos, 12)
-            surface.blit(trail_surface, (0, 0))
-
-        current_skin_img = self.skins.get(self.current_skin, self.skins["default"])
-        if not self.facing_right:
-            current_skin_img = pygame.transform.flip(current_skin_img, True, False)
-        surface.blit(current_skin_img, self.rect)
-
-    def jump(self):
-        if self.on_ground or (time.time() - self.game_start_time < INITIAL_JUMP_DELAY and self.initial_jump_available):
+            trail_rect = trail_renderer.draw(surface, self.current_trail, self.trail_points, camera_y)
+
+        right, left = self.skins.get(self.current_skin) or self.skins["default"]
+        rect = surface.blit(right if self.facing_right else left, (self.rect.x, self.rect.y + camera_y))
+        if trail_rect is not None:
+            rect.union_ip(trail_rect)
+        return rect
+
+    def jump(self, now):
+        if self.on_ground or (now - self.game_start_time < INITIAL_JUMP_DELAY and self.initial_jump_available):
             self.velocity_y = INITIAL_JUMP_VELOCITY
             self.on_ground = False
             self.initial_jump_available = False
             self.jump_count += 1
-            self.check_background_transition()
+            return True
+        return False
 
     def check_background_transition(self):
         global current_bg_index, is_transitioning, next_bg, transition_alpha
         new_bg_index = 0
-        if self.jump_count >= 100:
-            new_bg_index = 2
-        elif self.jump_count >= 40:
-            new_bg_index = 1
+        for threshold, index in BACKGROUND_THRESHOLDS:
+            if self.jump_count >= threshold:
+                new_bg_index = index
+                break
+        prefetch_backgrounds(self.jump_count)
         if new_bg_index != current_bg_index and not is_transitioning:
             is_transitioning = True
             next_bg = load_background(new_bg_index)
@@ -301,11 +696,11 @@ class Player:
             high_score = current_score
         save_game()  # Save game state после сбора монет
 
-    def update(self):
+    def update(self, now):
         self.old_y = self.rect.y
         self.old_x = self.rect.x
         self.velocity_y += GRAVITY
-        self.rect.y += self.velocity_y
+        shift_y(self.rect, self.velocity_y)
         self.rect.x += self.velocity_x
         if self.rect.left < 0:
             self.rect.left = 0
@@ -315,56 +710,125 @@ class Player:
             self.facing_right = True
         elif self.velocity_x < 0:
             self.facing_right = False
-        current_time = time.time()
         if (self.current_trail != "none" and
-                current_time - self.last_trail_update > self.trail_update_delay):
-            self.trail_points.insert(0, {
-                "x": self.rect.centerx,
-                "y": self.rect.centery,
-                "time": current_time
-            })
-            self.last_trail_update = current_time
-        max_trail_points = 50
-        if len(self.trail_points) > max_trail_points:
-            self.trail_points = self.trail_points[:max_trail_points]
+                now - self.last_trail_update > self.trail_update_delay):
+            self.trail_points.push(self.rect.centerx, self.rect.centery)
+            self.last_trail_update = now
+
+# Общий атлас спрайтов платформ: каждый тип рисуется один раз на процесс,
+# экземпляры Platform хранят только ссылку на список кадров своего типа.
+PLATFORM_STYLES = {
+    "normal": (PLATFORM_COLOR, (150, 150, 255)),
+    "disappearing": (DISAPPEARING_COLOR, (255, 150, 150)),
+    "spring": (SPRING_COLOR, (200, 255, 200)),
+}
+SPRING_FRAMES = 10
+FADE_LEVELS = 32
+_platform_atlas = {}
+_platform_fades = {}
+
+
+def _render_platform(platform_type):
+    body_color, top_color = PLATFORM_STYLES[platform_type]
+    img = pygame.Surface((PLATFORM_WIDTH, PLATFORM_HEIGHT), pygame.SRCALPHA)
+    for i in range(PLATFORM_HEIGHT):
+        alpha = 255 - i*10
+        pygame.draw.rect(img, (*body_color, alpha), (0, i, PLATFORM_WIDTH, 1))
+    if platform_type == "spring":
+        spring_color = (50, 200, 50)
+        for i in range(3):
+            y_pos = PLATFORM_HEIGHT - 5 - i*3
+            pygame.draw.line(img, spring_color, (5, y_pos), (PLATFORM_WIDTH-5, y_pos), 2)
+    # Верхняя кромка непрозрачная, поэтому её можно впечь прямо в спрайт
+    img.fill(top_color, (0, 0, PLATFORM_WIDTH, 4))
+    return img
+
+
+def _compress_platform(img, spring_frame):
+    # Сжатая пружина: верх спрайта, опущенный на величину сжатия
+    compression = 3 * (1 - spring_frame / SPRING_FRAMES)
+    frame = pygame.Surface((PLATFORM_WIDTH, PLATFORM_HEIGHT), pygame.SRCALPHA)
+    frame.blit(img, (0, int(compression)), (0, 0, PLATFORM_WIDTH, int(PLATFORM_HEIGHT - compression)))
+    return frame
+
+
+def platform_frames(platform_type):
+    # [0] — обычный вид, [1 + spring_frame] — кадры сжатия пружины
+    frames = _platform_atlas.get(platform_type)
+    if frames is None:
+        img = _render_platform(platform_type)
+        frames = [img]
+        if platform_type == "spring":
+            frames += [_compress_platform(img, f) for f in range(SPRING_FRAMES)]
+        frames = [maybe_convert(f) for f in frames]
+        _platform_atlas[platform_type] = frames
+    return frames
+
+
+def platform_fade_frames(platform_type):
+    # Копии обычного спрайта с заранее выставленной прозрачностью, FADE_LEVELS уровней
+    fades = _platform_fades.get(platform_type)
+    if fades is None:
+        img = platform_frames(platform_type)[0]
+        fades = []
+        for level in range(FADE_LEVELS):
+            frame = img.copy()
+            frame.set_alpha(round(level * 255 / (FADE_LEVELS - 1)))
+            fades.append(frame)
+        _platform_fades[platform_type] = fades
+    return fades
+
+
+class EntityPool:
+    # Пул переиспользуемых сущностей: acquire() берет свободный экземпляр и
+    # переинициализирует его через init(), release() возвращает в пул.
+    def __init__(self, cls):
+        self.cls = cls
+        self.free = []
+        self.active = 0
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, *args):
+        self.active += 1
+        if self.free:
+            self.hits += 1
+            obj = self.free.pop()
+            obj.init(*args)
+            return obj
+        self.misses += 1
+        return self.cls(*args)
+
+    def release(self, obj):
+        self.active -= 1
+        self.free.append(obj)
+
+    def stats(self):
+        return {"active": self.active, "free": len(self.free), "hits": self.hits, "misses": self.misses}
+
 
 class Platform:
-    def __init__(self, x, y):
+    __slots__ = ("rect", "type", "disappear_time", "activated", "spring_compressed", "spring_frame",
+                 "frames", "counted", "grid_row")
+
+    def __init__(self, x, y, rng=random):
         self.rect = pygame.Rect(x, y, PLATFORM_WIDTH, PLATFORM_HEIGHT)
-        self.type = random.choices(["normal", "disappearing", "spring"], weights=[0.7, 0.2, 0.1])[0]
+        self.init(x, y, rng)
+
+    def init(self, x, y, rng=random):
+        self.rect.topleft = (x, y)
+        self.type = rng.choices(["normal", "disappearing", "spring"], weights=[0.7, 0.2, 0.1])[0]
         self.disappear_time = None
         self.activated = False
         self.spring_compressed = False
         self.spring_frame = 0
-        self.top_surface = pygame.Surface((PLATFORM_WIDTH, 4))
-        self.platform_img = pygame.Surface((PLATFORM_WIDTH, PLATFORM_HEIGHT), pygame.SRCALPHA)
-        self.counted = False  
-        if self.type == "normal":
-            for i in range(PLATFORM_HEIGHT):
-                alpha = 255 - i*10
-                color = (*PLATFORM_COLOR, alpha)
-                pygame.draw.rect(self.platform_img, color, (0, i, PLATFORM_WIDTH, 1))
-            self.top_surface.fill((150, 150, 255))
-        elif self.type == "disappearing":
-            for i in range(PLATFORM_HEIGHT):
-                alpha = 255 - i*10
-                color = (*DISAPPEARING_COLOR, alpha)
-                pygame.draw.rect(self.platform_img, color, (0, i, PLATFORM_WIDTH, 1))
-            self.top_surface.fill((255, 150, 150))
-        else:
-            for i in range(PLATFORM_HEIGHT):
-                alpha = 255 - i*10
-                color = (*SPRING_COLOR, alpha)
-                pygame.draw.rect(self.platform_img, color, (0, i, PLATFORM_WIDTH, 1))
-            self.top_surface.fill((200, 255, 200))
-            spring_color = (50, 200, 50)
-            for i in range(3):
-                y_pos = PLATFORM_HEIGHT - 5 - i*3
-                pygame.draw.line(self.platform_img, spring_color, (5, y_pos), (PLATFORM_WIDTH-5, y_pos), 2)
-
-    def should_disappear(self):
+        self.frames = platform_frames(self.type)
+        self.counted = False
+        self.grid_row = None
+
+    def should_disappear(self, now):
         if self.type == "disappearing" and self.activated:
-            return time.time() - self.disappear_time >= 2
+            return now - self.disappear_time >= 2
         return False
 
     def compress_spring(self):
@@ -375,85 +839,171 @@ class Platform:
     def update_spring(self):
         if self.spring_compressed:
             self.spring_frame += 1
-            if self.spring_frame >= 10:
+            if self.spring_frame >= SPRING_FRAMES:
                 self.spring_compressed = False
 
-    def draw(self, surface):
+    def submit(self, add, now, camera_y=0):
+        if self.spring_compressed:
+            img = self.frames[1 + min(self.spring_frame, SPRING_FRAMES - 1)]
+        else:
+            img = self.frames[0]
         if self.type == "disappearing" and self.activated:
-            time_passed = time.time() - self.disappear_time
+            time_passed = now - self.disappear_time
             alpha = max(0, 255 - int(255 * (time_passed / 2)))
-            self.platform_img.set_alpha(alpha)
-            self.top_surface.set_alpha(alpha)
-        if self.type == "spring" and self.spring_compressed:
-            compression = 3 * (1 - self.spring_frame / 10)
-            compressed_img = pygame.Surface((PLATFORM_WIDTH, PLATFORM_HEIGHT - compression), pygame.SRCALPHA)
-            compressed_img.blit(self.platform_img, (0, 0))
-            surface.blit(compressed_img, (self.rect.x, self.rect.y + compression))
-            surface.blit(self.top_surface, (self.rect.x, self.rect.y + compression))
-        else:
-            surface.blit(self.platform_img, self.rect)
-            surface.blit(self.top_surface, (self.rect.x, self.rect.y))
+            img = platform_fade_frames(self.type)[(alpha * (FADE_LEVELS - 1) + 127) // 255]
+        add((img, (self.rect.x, self.rect.y + camera_y)))
+
+# Монеты одного типа делят картинку; синяя вращается по заранее повернутым кадрам
+COIN_ROTATION_FRAMES = 40  # период анимации в кадрах; в кадре k монета повернута на k градусов
+_coin_images = {}
+_coin_rotations = {}
+
+
+def _render_coin(coin_type):
+    img = pygame.Surface((COIN_SIZE, COIN_SIZE), pygame.SRCALPHA)
+    if coin_type == "yellow":
+        pygame.draw.circle(img, YELLOW, (COIN_SIZE//2, COIN_SIZE//2), COIN_SIZE//2)
+        pygame.draw.circle(img, (200, 200, 0), (COIN_SIZE//2, COIN_SIZE//2), COIN_SIZE//2 - 2)
+    else:
+        diamond_points = [
+            (COIN_SIZE//2, 2),
+            (COIN_SIZE-2, COIN_SIZE//2),
+            (COIN_SIZE//2, COIN_SIZE-2),
+            (2, COIN_SIZE//2)
+        ]
+        pygame.draw.polygon(img, (50, 150, 255), diamond_points)
+        pygame.draw.polygon(img, (100, 200, 255), [
+            (COIN_SIZE//2, COIN_SIZE//4),
+            (3*COIN_SIZE//4, COIN_SIZE//2),
+            (COIN_SIZE//2, 3*COIN_SIZE//4)
+        ])
+    return img
+
+
+def coin_image(coin_type):
+    img = _coin_images.get(coin_type)
+    if img is None:
+        img = maybe_convert(_render_coin(coin_type))
+        _coin_images[coin_type] = img
+    return img
+
+
+def coin_rotation_frames(coin_type):
+    # [(кадр, смещение от rect.topleft)] для углов 0..COIN_ROTATION_FRAMES-1 градусов;
+    # смещение держит центр повернутого кадра в центре монеты
+    frames = _coin_rotations.get(coin_type)
+    if frames is None:
+        base = coin_image(coin_type)
+        center = (COIN_SIZE // 2, COIN_SIZE // 2)
+        frames = []
+        for angle in range(COIN_ROTATION_FRAMES):
+            rotated = pygame.transform.rotate(base, angle)
+            frames.append((rotated, rotated.get_rect(center=center).topleft))
+        _coin_rotations[coin_type] = frames
+    return frames
+
 
 class Coin:
-    def __init__(self, x, y, coin_type="yellow"):
+    # Анимация не хранится в монете: фаза выводится из кадра мира и кадра
+    # появления, поэтому шаг симуляции не обходит монеты ради анимации
+    __slots__ = ("rect", "type", "value", "born", "grid_row", "image")
+
+    def __init__(self, x, y, coin_type="yellow", born=0):
         self.rect = pygame.Rect(x, y, COIN_SIZE, COIN_SIZE)
-        self.type = coin_type
+        self.type = None
+        self.init(x, y, coin_type, born)
+
+    def init(self, x, y, coin_type="yellow", born=0):
+        self.rect.topleft = (x, y)
+        if coin_type != self.type:
+            self.type = coin_type
+            self.image = coin_image(coin_type)
         self.value = 1 if coin_type == "yellow" else 3
-        self.animation_frame = 0
-        self.image = self._create_coin_image()
-
-    def _create_coin_image(self):
-        img = pygame.Surface((COIN_SIZE, COIN_SIZE), pygame.SRCALPHA)
-        if self.type == "yellow":
-            pygame.draw.circle(img, YELLOW, (COIN_SIZE//2, COIN_SIZE//2), COIN_SIZE//2)
-            pygame.draw.circle(img, (200, 200, 0), (COIN_SIZE//2, COIN_SIZE//2), COIN_SIZE//2 - 2)
+        self.born = born
+        self.grid_row = None
+
+    def submit(self, add, camera_y=0, frame=0):
+        # Фаза — кадры с появления по кругу из COIN_ROTATION_FRAMES: четверть
+        # круга монета приподнята на пиксель, еще через четверть опущена
+        ticks = (frame - self.born) % COIN_ROTATION_FRAMES
+        offset = camera_y
+        quarter = ticks // (COIN_ROTATION_FRAMES // 4)
+        if quarter == 1:
+            offset -= 1
+        elif quarter == 3:
+            offset += 1
+        if self.type == "blue":
+            img, (dx, dy) = coin_rotation_frames(self.type)[ticks]
+            add((img, (self.rect.x + dx, self.rect.y + dy + offset)))
         else:
-            diamond_points = [
-                (COIN_SIZE//2, 2),
-                (COIN_SIZE-2, COIN_SIZE//2),
-                (COIN_SIZE//2, COIN_SIZE-2),
-                (2, COIN_SIZE//2)
-            ]
-            pygame.draw.polygon(img, (50, 150, 255), diamond_points)
-            pygame.draw.polygon(img, (100, 200, 255), [
-                (COIN_SIZE//2, COIN_SIZE//4),
-                (3*COIN_SIZE//4, COIN_SIZE//2),
-                (COIN_SIZE//2, 3*COIN_SIZE//4)
-            ])
-        return img
+            add((self.image, (self.rect.x, self.rect.y + offset)))
 
-    def update(self):
-        self.animation_frame = (self.animation_frame + 0.1) % 4
+FLOATING_TEXT_LIFE = 60  # кадров
 
-    def draw(self, surface):
-        offset = 0
-        if int(self.animation_frame) == 1:
-            offset = -1
-        if int(self.animation_frame) == 3:
-            offset = 1
-        if self.type == "blue":
-            angle = self.animation_frame * 10
-            rotated_img = pygame.transform.rotate(self.image, angle)
-            new_rect = rotated_img.get_rect(center=self.rect.center)
-            surface.blit(rotated_img, (new_rect.x, new_rect.y + offset))
-        else:
-            surface.blit(self.image, (self.rect.x, self.rect.y + offset))
 
 class FloatingText:
-    def __init__(self, x, y, text, color=(255, 255, 0)):
-        self.x = x
-        self.y = y
-        self.text = text
-        self.color = color
-        self.life = 60
-    def update(self):
-        self.y -= 0.5
-        self.life -= 1
-    def draw(self, surface, font):
-        alpha = max(0, min(255, int(255 * (self.life / 60))))
-        text_surf = font.render(self.text, True, self.color)
+    # Вид на одну запись FloatingTextStore для отрисовки. Хранилище переиспользует
+    # один экземпляр при обходе, так что держать его дольше итерации нельзя
+    __slots__ = ("x", "y", "text", "color", "life")
+
+    def draw(self, surface, font, camera_y=0):
+        alpha = max(0, min(255, int(255 * (self.life / FLOATING_TEXT_LIFE))))
+        text_surf = render_text(font, self.text, self.color)
+        # Поверхность из общего кэша: прозрачность только на время отрисовки
         text_surf.set_alpha(alpha)
-        surface.blit(text_surf, (self.x, self.y))
+        rect = surface.blit(text_surf, (self.x, self.y + camera_y))
+        text_surf.set_alpha(255)
+        return rect
+
+
+class FloatingTextStore:
+    # Всплывающие тексты по столбцам: x, начальная y и кадр появления в array,
+    # строки и цвета в списках. Подъем и затухание выводятся из возраста записи,
+    # а жизнь у всех одинаковая, поэтому истекшие записи всегда лежат в начале
+    # столбцов и срезаются разом — кадр не обходит тексты по одному.
+    def __init__(self):
+        self.xs = array("d")
+        self.ys = array("d")
+        self.born = array("q")
+        self.texts = []
+        self.colors = []
+        self.frame = 0
+        self.view = FloatingText()
+
+    def add(self, x, y, text, color, frame):
+        self.xs.append(x)
+        self.ys.append(y)
+        self.born.append(frame)
+        self.texts.append(text)
+        self.colors.append(color)
+
+    def update(self, frame):
+        # Запись, появившаяся в кадре born, к концу кадра frame прожила frame - born + 1
+        # шагов и истекает, когда их набирается FLOATING_TEXT_LIFE (жизнь дошла до нуля)
+        self.frame = frame
+        expired = bisect_right(self.born, frame - FLOATING_TEXT_LIFE + 1)
+        if expired:
+            for column in (self.xs, self.ys, self.born, self.texts, self.colors):
+                del column[:expired]
+
+    def clear(self):
+        for column in (self.xs, self.ys, self.born, self.texts, self.colors):
+            del column[:]
+
+    def __len__(self):
+        return len(self.born)
+
+    def __iter__(self):
+        view = self.view
+        frame = self.frame + 1
+        for x, y, born, text, color in zip(self.xs, self.ys, self.born, self.texts, self.colors):
+            age = frame - born
+            view.x = x
+            view.y = y - 0.5 * age
+            view.text = text
+            view.color = color
+            view.life = FLOATING_TEXT_LIFE - age
+            yield view
 
 # Детализированная отрисовка крыльев
 
@@ -461,6 +1011,7 @@ def draw_single_wing(surface, cx, cy, direction=1, scale=1.0, flap=0.0, tint=(23
     # direction: -1 левое крыло, 1 правое крыло
     # Рисуем несколько эл��ипсов-перьев, смещая их по оси X и Y для имитации объема и взмаха
     feathers = 5
+    dirty = None
     for i in range(feathers):
         t = i / (feathers - 1)
         w = int((22 - 4 * i) * scale)
@@ -470,9 +1021,14 @@ def draw_single_wing(surface, cx, cy, direction=1, scale=1.0, flap=0.0, tint=(23
         rect = pygame.Rect(cx + dx - w // 2, cy + dy - h // 2, w, h)
         # светлое перо
         col = (min(255, tint[0] + int(10 * (1 - t))), min(255, tint[1] + int(10 * (1 - t))), min(255, tint[2] + int(10 * (1 - t))))
-        pygame.draw.ellipse(surface, col, rect)
+        r = pygame.draw.ellipse(surface, col, rect)
         # контур
         pygame.draw.ellipse(surface, outline, rect, 1)
+        if dirty is None:
+            dirty = r
+        else:
+            dirty.union_ip(r)
+    return dirty
 
 
 def draw_wings_detailed(surface, left_center, right_center, scale=1.0, phase=0.0, active=True):
@@ -480,117 +1036,1177 @@ def draw_wings_detailed(surface, left_center, right_center, scale=1.0, phase=0.0
     flap_amp = 1.0 if active else 0.3
     flap = math.sin(phase) * flap_amp
     # левое крыло
-    draw_single_wing(surface, left_center[0], left_center[1], direction=-1, scale=scale, flap=flap)
+    left = draw_single_wing(surface, left_center[0], left_center[1], direction=-1, scale=scale, flap=flap)
     # правое крыло
-    draw_single_wing(surface, right_center[0], right_center[1], direction=1, scale=scale, flap=-flap)
+    right = draw_single_wing(surface, right_center[0], right_center[1], direction=1, scale=scale, flap=-flap)
+    return left.union(right)
+
+
+# Взмах крыльев (период 1 с) заранее нарисован в WING_FRAMES кадрах
+WING_FRAMES = 30
+_wing_frames = {}
+_life_icons = {}
+
+
+def wing_frame_index(ticks):
+    return (ticks % 1000) * WING_FRAMES // 1000
+
+
+def wing_frame(scale, active, spacing, index):
+    # Пара крыльев с центрами на расстоянии spacing по горизонтали.
+    # Возвращает (поверхность, положение центра левого крыла на ней)
+    key = (scale, active, spacing, index, WING_FRAMES)
+    frame = _wing_frames.get(key)
+    if frame is None:
+        pad = math.ceil(45 * scale) + 2
+        img = pygame.Surface((spacing + 2 * pad, 2 * pad), pygame.SRCALPHA)
+        phase = index / WING_FRAMES * 2 * math.pi
+        bounds = draw_wings_detailed(img, (pad, pad), (pad + spacing, pad), scale=scale, phase=phase, active=active)
+        img = maybe_convert(img.subsurface(bounds).copy())
+        frame = (img, (pad - bounds.x, pad - bounds.y))
+        _wing_frames[key] = frame
+    return frame
+
+
+def draw_wings(surface, left_center, right_center, scale, active, ticks):
+    img, (ox, oy) = wing_frame(scale, active, right_center[0] - left_center[0], wing_frame_index(ticks))
+    return surface.blit(img, (left_center[0] - ox, left_center[1] - oy))
+
+
+def life_icon(active, index):
+    # Значок второй жизни целиком (плашка, мини-крылья, цифра) и его место на экране
+    key = (active, index, WING_FRAMES)
+    icon = _life_icons.get(key)
+    if icon is None:
+        icon_rect = pygame.Rect(WIDTH - 36, 8, 26, 26)
+        cx, cy = icon_rect.center
+        wings, (ox, oy) = wing_frame(0.5, active, 12, index)
+        wings_rect = wings.get_rect(topleft=(cx - 6 - ox, cy - oy))
+        area = icon_rect.union(wings_rect)
+        img = pygame.Surface(area.size, pygame.SRCALPHA)
+        bg_col = (80, 140, 200) if active else (80, 80, 80)
+        pygame.draw.rect(img, bg_col, icon_rect.move(-area.x, -area.y), border_radius=6)
+        img.blit(wings, wings_rect.move(-area.x, -area.y))
+        two = render_text(get_font(12, bold=True), "2", BLACK)
+        img.blit(two, (cx - two.get_width()//2 - area.x, cy - two.get_height()//2 - area.y))
+        img = maybe_convert(img)
+        icon = (img, area.topleft)
+        _life_icons[key] = icon
+    return icon
+
+
+# Спрайты вертолета: корпус (обычный и использованный) и кадры ротора.
+# Ротор поворачивается шагами по HELI_ROTOR_STEP градусов, кадров всего 360 / шаг.
+HELI_ROTOR_STEP = 20
+HELI_ROTOR_BLADE = 28
+HELI_ROTOR_CENTER = HELI_ROTOR_BLADE + 4  # центр ротора в кадре, с запасом на толщину лопасти
+_heli_sprites = None
+
+
+def _render_heli_body(used):
+    # Корпус рисуется от левого верхнего угла rect; хвост и салазки выходят за него
+    width, height = Helicopter.WIDTH, Helicopter.HEIGHT
+    img = pygame.Surface((width + 4, height + 4), pygame.SRCALPHA)
+    rect = pygame.Rect(0, 0, width, height)
+    body_color = (170, 190, 210) if not used else (140, 150, 165)
+    pygame.draw.rect(img, body_color, rect, border_radius=6)
+    # Кабина (окно)
+    pygame.draw.rect(img, (140, 200, 255), (rect.left + 6, rect.top + 4, 16, 10), border_radius=3)
+    # Хвост
+    pygame.draw.rect(img, body_color, (rect.right - 12, rect.centery - 3, 14, 6))
+    # Салазки
+    pygame.draw.line(img, (70, 70, 80), (rect.left + 6, rect.bottom), (rect.left + 18, rect.bottom), 3)
+    pygame.draw.line(img, (70, 70, 80), (rect.right - 18, rect.bottom), (rect.right - 6, rect.bottom), 3)
+    return img
+
+
+def _render_heli_rotor(angle):
+    # Две лопасти под 90 градусов и вал ротора
+    size = 2 * HELI_ROTOR_CENTER + 1
+    img = pygame.Surface((size, size), pygame.SRCALPHA)
+    cx = cy = HELI_ROTOR_CENTER
+    angle_rad = math.radians(angle)
+    for rad in (angle_rad, angle_rad + math.pi / 2):
+        dx = HELI_ROTOR_BLADE * math.cos(rad)
+        dy = HELI_ROTOR_BLADE * math.sin(rad)
+        pygame.draw.line(img, (50, 50, 50), (cx + dx, cy + dy), (cx - dx, cy - dy), 3)
+    pygame.draw.circle(img, (80, 80, 80), (cx, cy), 4)
+    # Хвостовой ротор вращается вдвое быстрее; его центр у конца хвоста,
+    # на (WIDTH // 2 + 4, HEIGHT // 2 + 6) от центра основного ротора
+    tr_cx = cx + Helicopter.WIDTH // 2 + 4
+    tr_cy = cy + Helicopter.HEIGHT // 2 + 6
+    tr_len = 6
+    a = angle_rad * 2
+    dx = tr_len * math.cos(a)
+    dy = tr_len * math.sin(a)
+    pygame.draw.line(img, (60, 60, 60), (tr_cx + dx, tr_cy + dy), (tr_cx - dx, tr_cy - dy), 2)
+    return img
+
+
+def helicopter_sprites():
+    # ({used: корпус}, [кадр ротора для угла i * HELI_ROTOR_STEP])
+    global _heli_sprites
+    if _heli_sprites is None:
+        bodies = {False: _render_heli_body(False), True: _render_heli_body(True)}
+        rotors = [_render_heli_rotor(a) for a in range(0, 360, HELI_ROTOR_STEP)]
+        bodies = {k: maybe_convert(v) for k, v in bodies.items()}
+        rotors = [maybe_convert(r) for r in rotors]
+        _heli_sprites = (bodies, rotors)
+    return _heli_sprites
 
 
 class Helicopter:
     WIDTH = 40
     HEIGHT = 20
-    def __init__(self, platform):
-        self.platform = platform
-        self.rect = pygame.Rect(platform.rect.centerx - self.WIDTH//2,
-                                platform.rect.top - self.HEIGHT - 2,
-                                self.WIDTH, self.HEIGHT)
+    __slots__ = ("rect", "used", "born", "expire_offset", "blink", "vanishing",
+                 "vanish_frames", "vanish_dy", "dead", "grid_row")
+
+    def __init__(self, platform, born=0, camera_offset=0):
+        self.rect = pygame.Rect(0, 0, self.WIDTH, self.HEIGHT)
+        self.init(platform, born, camera_offset)
+
+    def init(self, platform, born=0, camera_offset=0):
+        # Вертолет стоит над платформой, пока его не подберут: платформы в мировых
+        # координатах неподвижны, так что следить за ней каждый кадр не нужно
+        self.rect.topleft = (platform.rect.centerx - self.WIDTH//2, platform.rect.top - self.HEIGHT - 2)
         self.used = False
-        self.rotor_angle = 0
-        # TTL по платформам
-        self.lifetime_px = HELI_LIFETIME_PLATFORMS * PLATFORM_GAP
+        # Кадр появления: от него отсчитывается поворот ротора
+        self.born = born
+        # TTL по платформам: вертолет исчезает, когда камера уйдет до этого смещения
+        self.expire_offset = camera_offset + HELI_LIFETIME_PLATFORMS * PLATFORM_GAP
         self.blink = False
         self.vanishing = False
         self.vanish_frames = 0
         self.vanish_dy = 0
         self.dead = False
+        self.grid_row = None
+    def start_vanish(self):
+        self.vanishing = True
+        self.vanish_frames = 12
+        self.vanish_dy = -3
     def update(self):
-        self.rotor_angle = (self.rotor_angle + 20) % 360
-        if self.vanishing:
-            # Небольшой прыжок перед исчезновением
-            self.rect.y += self.vanish_dy
-            self.vanish_dy += 0.6
-            self.vanish_frames -= 1
-            if self.vanish_frames <= 0:
-                self.dead = True
-        # До взлета держим вертолет точно над платформой
-        if not self.used and not self.vanishing and hasattr(self, 'platform') and self.platform is not None:
-            self.rect.centerx = self.platform.rect.centerx
-            self.rect.bottom = self.platform.rect.top - 2
-    def draw(self, surface):
+        # Вызывается только для исчезающих: небольшой прыжок перед исчезновением
+        shift_y(self.rect, self.vanish_dy)
+        self.vanish_dy += 0.6
+        self.vanish_frames -= 1
+        if self.vanish_frames <= 0:
+            self.dead = True
+    def submit(self, add, camera_y=0, frame=0):
         # Мигать, когда скоро исчезнет
         if self.blink and not self.vanishing:
             # Мигание в последние секунды жизни: исчезает на долю секунды
             ticks = pygame.time.get_ticks()
             if (ticks % 120) < 60:
                 return
-        # Корпус
-        body_color = (170, 190, 210) if not self.used else (140, 150, 165)
-        pygame.draw.rect(surface, body_color, self.rect, border_radius=6)
-        # Кабина (окно)
-        cabin_rect = pygame.Rect(self.rect.left + 6, self.rect.top + 4, 16, 10)
-        pygame.draw.rect(surface, (140, 200, 255), cabin_rect, border_radius=3)
-        # Хвост
-        tail_rect = pygame.Rect(self.rect.right - 12, self.rect.centery - 3, 14, 6)
-        pygame.draw.rect(surface, body_color, tail_rect)
-        # Салазки
-        pygame.draw.line(surface, (70, 70, 80), (self.rect.left + 6, self.rect.bottom), (self.rect.left + 18, self.rect.bottom), 3)
-        pygame.draw.line(surface, (70, 70, 80), (self.rect.right - 18, self.rect.bottom), (self.rect.right - 6, self.rect.bottom), 3)
-        # Основной ротор (вращающиеся лопасти)
-        cx, cy = self.rect.centerx, self.rect.top - 6
-        blade_len = 28
-        angle_rad = math.radians(self.rotor_angle)
-        x1 = cx + blade_len * math.cos(angle_rad)
-        y1 = cy + blade_len * math.sin(angle_rad)
-        x2 = cx - blade_len * math.cos(angle_rad)
-        y2 = cy - blade_len * math.sin(angle_rad)
-        pygame.draw.line(surface, (50, 50, 50), (x1, y1), (x2, y2), 3)
-        # Вторая лопасть под 90 градусов
-        angle_rad2 = angle_rad + math.pi / 2
-        x3 = cx + blade_len * math.cos(angle_rad2)
-        y3 = cy + blade_len * math.sin(angle_rad2)
-        x4 = cx - blade_len * math.cos(angle_rad2)
-        y4 = cy - blade_len * math.sin(angle_rad2)
-        pygame.draw.line(surface, (50, 50, 50), (x3, y3), (x4, y4), 3)
-        # Вал ротора
-        pygame.draw.circle(surface, (80, 80, 80), (cx, cy), 4)
-        # Хвостовой ротор
-        tr_cx, tr_cy = tail_rect.right + 2, tail_rect.centery
-        tr_len = 6
-        a = angle_rad * 2
-        tx1 = tr_cx + tr_len * math.cos(a)
-        ty1 = tr_cy + tr_len * math.sin(a)
-        tx2 = tr_cx - tr_len * math.cos(a)
-        ty2 = tr_cy - tr_len * math.sin(a)
-        pygame.draw.line(surface, (60, 60, 60), (tx1, ty1), (tx2, ty2), 2)
-
-def generate_platforms(start_y, count):
-    global coins, helicopters
-    platforms = []
-    platforms.append(Platform(WIDTH // 2 - PLATFORM_WIDTH // 2, start_y))
-    for i in range(1, count):
-        x = random.randint(0, WIDTH - PLATFORM_WIDTH)
-        y = start_y - i * PLATFORM_GAP
-        p = Platform(x, y)
-        platforms.append(p)
+        bodies, rotors = helicopter_sprites()
+        x, y = self.rect.x, self.rect.y + camera_y
+        add((bodies[self.used], (x, y)))
+        # Ротор поворачивается на HELI_ROTOR_STEP за кадр с момента появления
+        add((rotors[(frame - self.born) % len(rotors)],
+             (x + self.WIDTH // 2 - HELI_ROTOR_CENTER, y - 6 - HELI_ROTOR_CENTER)))
+
+# Пулы сущностей общие для всех забегов, чтобы рестарт тоже не выделял память
+PLATFORM_POOL = EntityPool(Platform)
+COIN_POOL = EntityPool(Coin)
+HELICOPTER_POOL = EntityPool(Helicopter)
+
+
+def pool_stats():
+    return {
+        "platforms": PLATFORM_POOL.stats(),
+        "coins": COIN_POOL.stats(),
+        "helicopters": HELICOPTER_POOL.stats()
+    }
+
+
+# Биты ввода в записи повтора
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_JUMP = 4
+
+
+class FrameInput:
+    # Ввод за один кадр симуляции: удерживаемые стрелки и нажатие прыжка
+    def __init__(self, left=False, right=False, jump=False):
+        self.left = left
+        self.right = right
+        self.jump = jump
+
+    def to_bits(self):
+        return (INPUT_LEFT if self.left else 0) | (INPUT_RIGHT if self.right else 0) | (INPUT_JUMP if self.jump else 0)
+
+    @classmethod
+    def from_bits(cls, bits):
+        return cls(bool(bits & INPUT_LEFT), bool(bits & INPUT_RIGHT), bool(bits & INPUT_JUMP))
+
+
+class Replay:
+    # Запись забега: сид генератора, стартовые условия и по байту ввода на кадр.
+    # Проигрывается без окна с любой скоростью.
+    VERSION = 1
+
+    def __init__(self, seed, extra_life=False, double_coins=False, inputs=b"", result=None):
+        self.seed = seed
+        self.extra_life = extra_life
+        self.double_coins = double_coins
+        self.inputs = bytearray(inputs)
+        self.result = result
+
+    def record(self, frame_input):
+        self.inputs.append(frame_input.to_bits())
+
+    def finish(self, world):
+        self.result = {
+            "frames": world.frame,
+            "platforms_passed": world.platforms_passed,
+            "total_coins": world.coins_earned
+        }
+
+    def save(self, path):
+        data = {
+            "version": self.VERSION,
+            "seed": self.seed,
+            "extra_life": self.extra_life,
+            "double_coins": self.double_coins,
+            "inputs": base64.b64encode(zlib.compress(bytes(self.inputs))).decode("ascii"),
+            "result": self.result
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"Неподдерживаемая версия повтора: {data.get('version')}")
+        inputs = zlib.decompress(base64.b64decode(data["inputs"]))
+        return cls(data["seed"], data.get("extra_life", False), data.get("double_coins", False),
+                   inputs, data.get("result"))
+
+    def play(self):
+        world = GameWorld(headless=True, persistent=False, seed=self.seed,
+                          extra_life=self.extra_life, double_coins_enabled=self.double_coins)
+        for bits in self.inputs:
+            world.step(FrameInput.from_bits(bits))
+            if world.game_over:
+                break
+        return world
+
+    def verify(self, world=None):
+        # Возвращает список расхождений с записанным результатом (пустой — повтор совпал).
+        # Мир, созданный здесь, после сверки возвращает сущности в пулы; переданный
+        # мир освобождает вызывающий
+        if world is None:
+            world = self.play()
+            try:
+                return self.verify(world)
+            finally:
+                world.release_entities()
+        expected = self.result or {}
+        actual = {
+            "frames": world.frame,
+            "platforms_passed": world.platforms_passed,
+            "total_coins": world.coins_earned
+        }
+        return [(key, expected[key], actual[key]) for key in actual
+                if key in expected and expected[key] != actual[key]]
+
+
+def finish_replay(world):
+    if world.replay is not None and world.replay.result is None:
+        world.replay.finish(world)
+        save_replay(world.replay)
+
+
+def save_replay(replay):
+    try:
+        REPLAY_DIR.mkdir(exist_ok=True)
+        # Микросекунды и сид: забеги, законченные в одну секунду, не затирают друг друга,
+        # а имена по-прежнему сортируются по времени
+        path = REPLAY_DIR / f"replay_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{replay.seed}.json"
+        replay.save(path)
+        # Храним только последние MAX_REPLAYS записей
+        for old in sorted(REPLAY_DIR.glob("replay_*.json"))[:-MAX_REPLAYS]:
+            old.unlink()
+        return path
+    except Exception as e:
+        print(f"Ошибка сохранения повтора: {e}")
+        return None
+
+
+class SpatialIndex:
+    # Вертикальные ряды сетки платформ: ряд = мировая y // PLATFORM_GAP.
+    # Сущность регистрируется при спавне и удаляется при отсечении,
+    # а запрос возвращает только ряды, перекрывающие прямоугольник.
+    def __init__(self, row_height=PLATFORM_GAP):
+        self.row_height = row_height
+        self.rows = {}
+
+    def add(self, entity):
+        row = entity.rect.top // self.row_height
+        entity.grid_row = row
+        bucket = self.rows.get(row)
+        if bucket is None:
+            self.rows[row] = [entity]
+        else:
+            bucket.append(entity)
+
+    def remove(self, entity):
+        row = entity.grid_row
+        if row is None:
+            return
+        bucket = self.rows[row]
+        bucket.remove(entity)
+        if not bucket:
+            del self.rows[row]
+        entity.grid_row = None
+
+    def query(self, rect, margin=PLATFORM_HEIGHT):
+        # margin — максимальная высота сущности: ее верх может быть выше rect
+        found = []
+        for row in range((rect.top - margin) // self.row_height, rect.bottom // self.row_height + 1):
+            bucket = self.rows.get(row)
+            if bucket:
+                found.extend(bucket)
+        return found
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.rows.values())
+
+
+class GameWorld:
+    # Логика одного забега без окна, шрифтов и реального времени.
+    # main() только собирает ввод, вызывает step() и рисует состояние мира;
+    # в безголовом режиме мир можно прогонять тысячи кадров в секунду.
+    def __init__(self, headless=False, persistent=True, extra_life=None, double_coins_enabled=None,
+                 seed=None, record=False):
+        self.headless = headless
+        # persistent: обновлять глобальный прогресс (монеты, рекорд) и сохранения
+        self.persistent = persistent
+        # Собственный генератор на забег, чтобы забег можно было воспроизвести по сиду
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.frame = 0
+        self.time = 0.0
+        self.player = Player(load_skins=not headless)
+        self.coins = []
+        self.helicopters = []
+        self.floating_texts = FloatingTextStore()
+        self.platforms = []
+        self.platform_index = SpatialIndex()
+        self.coin_index = SpatialIndex()
+        self.heli_index = SpatialIndex()
+        # Платформы в порядке спавна (снизу вверх), еще не засчитанные игроку
+        self.uncounted = deque()
+        # Тающие платформы в порядке касания: первой исчезнет первая
+        self.fading = deque()
+        # Неподобранные вертолеты в порядке спавна: и снизу вверх, и по сроку TTL
+        self.heli_waiting = deque()
+        self.camera_offset = 0
+        self.lift_active = False
+        self.lift_remaining = 0
+        self.helicopter_carry = None
+        self.lift_scroll_accum = 0.0
+        self.extra_life_available = double_life if extra_life is None else extra_life
+        self.double_coins = double_coins if double_coins_enabled is None else double_coins_enabled
+        self.revive_active = False
+        self.revive_frames = 0
+        self.platforms_passed = 0
+        self.coins_earned = 0
+        self.jumped = False
+        self.game_over = False
+        self.replay = Replay(self.seed, self.extra_life_available, self.double_coins) if record else None
+        # FrameProfiler из main(); без него step() не тратит время на замеры
+        self.profiler = None
+        self.generate_platforms(HEIGHT - 50, 10)
+        if self.platforms:
+            self.player.rect.bottom = self.platforms[0].rect.top
+            self.player.on_ground = True
+            self.player.initial_jump_available = True
+
+    def spawn_platform(self, x, y):
+        rng = self.rng
+        p = self._add_platform(PLATFORM_POOL.acquire(x, y, rng))
         heli_spawned = False
         # Спавн вертолета строго над нормальной платформой с шансом 2%
-        if p.type == "normal" and random.random() < HELICOPTER_CHANCE:
-            helicopters.append(Helicopter(p))
+        if p.type == "normal" and rng.random() < HELICOPTER_CHANCE:
+            h = HELICOPTER_POOL.acquire(p, self.frame, self.camera_offset)
+            self.helicopters.append(h)
+            self.heli_index.add(h)
+            self.heli_waiting.append(h)
             heli_spawned = True
-        if (not heli_spawned) and random.random() < 0.4:
-            coin_type = "blue" if random.random() < 0.15 else "yellow"
-            coins.append(Coin(x + PLATFORM_WIDTH//2 - COIN_SIZE//2, y - COIN_SIZE - 5, coin_type))
-    return platforms
+        if (not heli_spawned) and rng.random() < 0.4:
+            coin_type = "blue" if rng.random() < 0.15 else "yellow"
+            coin = COIN_POOL.acquire(x + PLATFORM_WIDTH//2 - COIN_SIZE//2, y - COIN_SIZE - 5, coin_type, self.frame)
+            self.coins.append(coin)
+            self.coin_index.add(coin)
+        return p
+
+    def _add_platform(self, p):
+        self.platforms.append(p)
+        self.platform_index.add(p)
+        self.uncounted.append(p)
+        return p
+
+    @staticmethod
+    def _cull(items, keep, index, release):
+        # Оставляет в списке прошедшие фильтр, остальных снимает с индекса и возвращает в пул
+        kept = []
+        for item in items:
+            if keep(item):
+                kept.append(item)
+            else:
+                if index is not None:
+                    index.remove(item)
+                release(item)
+        return kept
+
+    @staticmethod
+    def _cull_below(items, limit, index, release):
+        # Платформы и монеты неподвижны и лежат в списке в порядке спавна (снизу вверх),
+        # поэтому ушедшие ниже limit всегда в начале списка и срезаются разом
+        count = 0
+        for item in items:
+            if item.rect.top <= limit:
+                break
+            index.remove(item)
+            release(item)
+            count += 1
+        if count:
+            del items[:count]
+
+    def _release_platform(self, platform):
+        # Экземпляр уйдет в пул: очереди подсчета и таяния не должны ссылаться на него
+        if not platform.counted:
+            self.uncounted.remove(platform)
+        if platform.activated:
+            self.fading.remove(platform)
+        PLATFORM_POOL.release(platform)
+
+    def release_entities(self):
+        # Возвращает все сущности забега в пулы; мир после этого не используется
+        for h in self.helicopters:
+            HELICOPTER_POOL.release(h)
+        for p in self.platforms:
+            PLATFORM_POOL.release(p)
+        for coin in self.coins:
+            COIN_POOL.release(coin)
+        self.helicopters = []
+        self.helicopter_carry = None
+        self.platforms = []
+        self.coins = []
+        self.floating_texts.clear()
+        self.platform_index = SpatialIndex()
+        self.coin_index = SpatialIndex()
+        self.heli_index = SpatialIndex()
+        self.uncounted.clear()
+        self.fading.clear()
+        self.heli_waiting.clear()
+
+    def generate_platforms(self, start_y, count):
+        self._add_platform(PLATFORM_POOL.acquire(WIDTH // 2 - PLATFORM_WIDTH // 2, start_y, self.rng))
+        for i in range(1, count):
+            x = self.rng.randint(0, WIDTH - PLATFORM_WIDTH)
+            self.spawn_platform(x, start_y - i * PLATFORM_GAP)
+
+    def _pass_platform(self):
+        global platforms_passed, max_platforms
+        self.platforms_passed += 1
+        if self.persistent:
+            platforms_passed = self.platforms_passed
+            if platforms_passed > max_platforms:
+                max_platforms = platforms_passed
+                save_game()
+
+    def _collect_coin(self, coin):
+        gain = coin.value * (2 if self.double_coins else 1)
+        self.coins_earned += gain
+        if self.persistent:
+            self.player.add_score(coin.value)
+        self.floating_texts.add(coin.rect.x, coin.rect.y, f"+{gain}", (255, 220, 80), self.frame)
+
+    def _end_lift(self):
+        carry = self.helicopter_carry
+        if carry in self.helicopters:
+            self.helicopters.remove(carry)
+            HELICOPTER_POOL.release(carry)
+        self.lift_active = False
+        self.helicopter_carry = None
+        self.player.on_ground = False
+        self.player.velocity_y = INITIAL_JUMP_VELOCITY * 1.5
+
+    def screen_y(self, world_y):
+        return world_y + self.camera_offset
+
+    def step(self, inputs):
+        if self.game_over:
+            return
+        if self.replay is not None:
+            self.replay.record(inputs)
+        player = self.player
+        now = self.time = self.frame * SIM_DT
+        self.frame += 1
+        self.jumped = False
+        world_scroll = 0
+        if inputs.jump:
+            self.jumped = player.jump(now)
+        player.velocity_x = 0
+        if inputs.left:
+            player.velocity_x = -PLAYER_SPEED
+        if inputs.right:
+            player.velocity_x = PLAYER_SPEED
+        # Управление вертолетом по горизонтали во время полета
+        carry = self.helicopter_carry
+        if self.lift_active and carry:
+            dx = 0
+            if inputs.left:
+                dx -= HELI_HORIZONTAL_SPEED
+            if inputs.right:
+                dx += HELI_HORIZONTAL_SPEED
+            carry.rect.x = max(0, min(WIDTH - carry.WIDTH, carry.rect.x + dx))
+            player.rect.centerx = carry.rect.centerx
+
+        player.update(now)
+        for h in self.helicopters:
+            if h.vanishing:
+                h.update()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.mark("update")
+        # Все сущности живут в мировых координатах; экранная y — screen_y(мировая)
+        if self.screen_y(player.rect.top) > HEIGHT:
+            if self.extra_life_available and not self.revive_active:
+                # Активируем вторую жизнь: крылья поднимают игрока
+                self.extra_life_available = False
+                self.revive_active = True
+                self.revive_frames = int(FPS * 1.5)
+                player.rect.bottom = HEIGHT - 10 - self.camera_offset
+                player.velocity_y = INITIAL_JUMP_VELOCITY * 1.5
+            else:
+                self.game_over = True
+                return
+        player.on_ground = False
+        if not self.lift_active:
+            for platform in self.platform_index.query(player.rect):
+                if (player.rect.colliderect(platform.rect) and
+                        player.velocity_y > 0 and
+                        player.old_y + PLAYER_SIZE <= platform.rect.top):
+                    player.rect.bottom = platform.rect.top
+                    player.velocity_y = 0
+                    player.on_ground = True
+                    if platform.type == "spring":
+                        player.velocity_y = INITIAL_JUMP_VELOCITY * 1.5
+                        platform.compress_spring()
+                        player.on_ground = False
+                    elif platform.type == "disappearing" and not platform.activated:
+                        platform.activated = True
+                        platform.disappear_time = now
+                        self.fading.append(platform)
+
+        # Захват вертолета
+        if not self.lift_active:
+            for h in self.heli_index.query(player.rect):
+                if (not h.vanishing) and player.rect.colliderect(h.rect):
+                    self.lift_active = True
+                    self.lift_remaining = self.rng.randint(20, 45) * PLATFORM_GAP
+                    self.helicopter_carry = h
+                    self.heli_index.remove(h)
+                    self.heli_waiting.remove(h)
+                    h.used = True
+                    player.velocity_y = 0
+                    player.on_ground = True
+                    break
 
-def load_background(index):
+        # Платформы идут в порядке спавна снизу вверх: засчитываем, пока они ниже игрока
+        uncounted = self.uncounted
+        while uncounted and player.rect.bottom < uncounted[0].rect.top:
+            uncounted.popleft().counted = True
+            self._pass_platform()
+        if profiler is not None:
+            profiler.mark("collision")
+
+        # Таяние у всех длится одинаково: истекшие стоят в начале очереди
+        fading = self.fading
+        while fading and fading[0].should_disappear(now):
+            platform = fading[0]
+            self.platforms.remove(platform)
+            self.platform_index.remove(platform)
+            self._release_platform(platform)
+
+        for coin in self.coin_index.query(player.rect):
+            if player.rect.colliderect(coin.rect):
+                self._collect_coin(coin)
+                self.coins.remove(coin)
+                self.coin_index.remove(coin)
+                COIN_POOL.release(coin)
+
+        # Всплывающие тексты: отбрасываем истекшие
+        self.floating_texts.update(self.frame)
+        if profiler is not None:
+            profiler.mark("coins")
+        # Анимация крыльев второй жизни
+        if self.revive_active:
+            self.revive_frames -= 1
+            shift_y(player.rect, -1.2)
+            if self.revive_frames <= 0:
+                self.revive_active = False
+        # Перемещение при подъеме на вертолете: вертолет действительно летит, камера подключается позже
+        carry = self.helicopter_carry
+        if self.lift_active and carry:
+            player.velocity_y = 0
+            # Пока вертолет ниже 1/3 экрана — поднимаем сам вертолет
+            if self.screen_y(carry.rect.top) > HEIGHT // 3:
+                shift_y(carry.rect, -LIFT_SPEED)
+                player.rect.bottom = carry.rect.top
+                self.lift_remaining -= LIFT_SPEED
+            else:
+                # Держим вертолет на 1/3 экрана, двигаем мир вниз равномерными целыми шагами
+                self.lift_scroll_accum += LIFT_SPEED
+                offset = int(self.lift_scroll_accum)
+                if offset > 0:
+                    # Вертолет с игроком поднимается вместе с камерой
+                    self.lift_scroll_accum -= offset
+                    self.camera_offset += offset
+                    world_scroll += offset
+                    carry.rect.y -= offset
+                    self.lift_remaining -= offset
+                player.rect.bottom = carry.rect.top
+            # Включить мигание за 3 секунды до исчезновения
+            if not carry.vanishing and self.lift_remaining <= HELI_BLINK_BEFORE_VANISH_SEC * HELI_SCROLL_PX_PER_SEC:
+                carry.blink = True
+            if self.lift_remaining <= 0:
+                self._end_lift()
+
+        if not self.lift_active and self.screen_y(player.rect.top) < HEIGHT // 3:
+            offset = HEIGHT // 3 - self.screen_y(player.rect.top)
+            self.camera_offset += offset
+            world_scroll += offset
+
+        # TTL вертолетов по прокрутке мира: сроки растут в порядке спавна, поэтому
+        # смотрим только начало очереди ожидающих, пока срок не окажется дальше камеры
+        waiting = self.heli_waiting
+        if world_scroll > 0:
+            while waiting and waiting[0].expire_offset <= self.camera_offset:
+                waiting.popleft().start_vanish()
+            blink_offset = self.camera_offset + HELI_BLINK_BEFORE_VANISH_SEC * HELI_SCROLL_PX_PER_SEC
+            for h in waiting:
+                if h.expire_offset > blink_offset:
+                    break
+                h.blink = True
+        if profiler is not None:
+            profiler.mark("scroll")
+        # Удаляем платформы, монеты и вертолеты, которые вышли за пределы экрана или завершили анимацию исчезновения
+        bottom = HEIGHT - self.camera_offset  # нижняя кромка экрана в мировых координатах
+        self._cull_below(self.platforms, bottom, self.platform_index, self._release_platform)
+        # Монеты ниже экрана игрок уже не достанет (запас на высоту игрока)
+        self._cull_below(self.coins, bottom + PLAYER_SIZE, self.coin_index, COIN_POOL.release)
+        # Принудительно запускаем исчезновение вертолетов у нижней кромки, если игрок их не подобрал;
+        # ожидающие стоят снизу вверх, так что у кромки только начало очереди
+        while waiting and waiting[0].rect.bottom >= bottom - 8:
+            waiting.popleft().start_vanish()
+        self.helicopters = self._cull(self.helicopters,
+                                      lambda h: (h.rect.top <= bottom) and (not h.dead) and (h.used or h.rect.bottom < bottom - 4),
+                                      self.heli_index, HELICOPTER_POOL.release)
+
+        if self.platforms:
+            highest_platform = min(p.rect.y for p in self.platforms)
+            while self.screen_y(highest_platform) > 0:
+                new_y = highest_platform - PLATFORM_GAP
+                self.spawn_platform(self.rng.randint(0, WIDTH - PLATFORM_WIDTH), new_y)
+                highest_platform = new_y
+        if profiler is not None:
+            profiler.mark("cull")
+
+
+def run_headless(frames, policy=None, **world_kwargs):
+    # Прогон забега без окна на максимальной скорости CPU.
+    # policy(world) -> FrameInput; по умолчанию игрок ничего не нажимает.
+    # Сущности мира возвращаются в пулы, наружу отдается только итог забега.
+    world = GameWorld(headless=True, persistent=False, **world_kwargs)
+    idle = FrameInput()
     try:
-        bg = pygame.image.load(str(Path(__file__).parent / BACKGROUNDS[index]))
-        bg = pygame.transform.scale(bg, (WIDTH, HEIGHT)).convert()
-        return bg
-    except Exception:
-        bg = pygame.Surface((WIDTH, HEIGHT)).convert()
-        colors = [(30, 60, 30), (60, 30, 60), (30, 30, 60)][index]
-        bg.fill(colors)
-        return bg
+        for _ in range(frames):
+            world.step(policy(world) if policy else idle)
+            if world.game_over:
+                break
+        return {
+            "frames": world.frame,
+            "platforms_passed": world.platforms_passed,
+            "total_coins": world.coins_earned,
+            "game_over": world.game_over
+        }
+    finally:
+        world.release_entities()
+
+def load_background(index):
+    colors = [(30, 60, 30), (60, 30, 60), (30, 30, 60)][index]
+    bg = assets.get(BACKGROUNDS[index], (WIDTH, HEIGHT), fallback=colors)
+    # Поверхность общая: сбрасываем прозрачность, оставшуюся от прошлого перехода
+    bg.set_alpha(None)
+    return bg
+
+def prefetch_backgrounds(jump_count):
+    # Декодируем следующий фон заранее, чтобы переход не ждал диска
+    for threshold, index in BACKGROUND_THRESHOLDS:
+        if index > current_bg_index and jump_count >= threshold - BACKGROUND_PREFETCH_JUMPS:
+            assets.prefetch(BACKGROUNDS[index])
+
+# Слои очереди отрисовки снизу вверх
+LAYER_PLATFORMS = 0
+LAYER_COINS = 1
+LAYER_HELICOPTERS = 2
+RENDER_LAYERS = 3
+
+
+class RenderQueue:
+    # Спрайты мира копятся по слоям парами (картинка, позиция), и flush()
+    # переносит каждый слой одним вызовом Surface.blits (fblits в pygame-ce),
+    # вместо отдельного blit на каждую сущность. Списки слоев переиспользуются.
+    def __init__(self, layers=RENDER_LAYERS):
+        self.layers = [[] for _ in range(layers)]
+
+    def layer(self, index):
+        # Сущности получают готовую функцию добавления пары (картинка, позиция) в слой
+        return self.layers[index].append
+
+    def flush(self, surface, track=True):
+        # track: вернуть прямоугольники для DirtyRectRenderer; без них
+        # достаточно fblits, который ничего не возвращает
+        rects = []
+        fblits = None if track else getattr(surface, "fblits", None)
+        for layer in self.layers:
+            if not layer:
+                continue
+            if track:
+                rects += surface.blits(layer)
+            elif fblits is not None:
+                fblits(layer)
+            else:
+                surface.blits(layer, doreturn=False)
+            layer.clear()
+        return rects
+
+
+render_queue = RenderQueue()
+
+
+def draw_world(surface, world, popup_font, track=True):
+    # Камера применяется только здесь; то, что целиком вне экрана, в очередь
+    # не попадает. Возвращает прямоугольники, которые были изменены
+    # (None пропускаются позже); при track=False — только не из очереди
+    player = world.player
+    cam = world.camera_offset
+    top = -cam - PLATFORM_GAP
+    bottom = HEIGHT - cam
+    queue = render_queue
+    now, frame = world.time, world.frame
+    add = queue.layer(LAYER_PLATFORMS)
+    for platform in world.platforms:
+        if top < platform.rect.y < bottom:
+            platform.submit(add, now, cam)
+    add = queue.layer(LAYER_COINS)
+    for coin in world.coins:
+        if top < coin.rect.y < bottom:
+            coin.submit(add, cam, frame)
+    add = queue.layer(LAYER_HELICOPTERS)
+    for h in world.helicopters:
+        if top < h.rect.y < bottom:
+            h.submit(add, cam, frame)
+    rects = queue.flush(surface, track)
+    add = rects.append
+    # Тексты делят поверхности из кэша и получают прозрачность на время
+    # своего blit, поэтому рисуются сразу, поверх слоев очереди
+    for ft in world.floating_texts:
+        add(ft.draw(surface, popup_font, cam))
+    # Крылья вокруг игрока при второй жизни (детализированные)
+    if world.revive_active:
+        left_center = (player.rect.left - 6, player.rect.centery + cam)
+        right_center = (player.rect.right + 6, player.rect.centery + cam)
+        add(draw_wings(surface, left_center, right_center, 1.0, True, pygame.time.get_ticks()))
+    add(player.draw(surface, cam))
+    return rects
+
+
+_hud_panel = None
+
+
+def draw_hud(surface, world):
+    global _hud_panel
+    if _hud_panel is None:
+        _hud_panel = pygame.Surface((250, 80), pygame.SRCALPHA)
+        pygame.draw.rect(_hud_panel, (0, 0, 0, 150), (0, 0, 250, 80), border_radius=5)
+    score_surface = _hud_panel
+    font = get_font(24, bold=True)
+    score_text = render_text(font, f"Платформы: {world.platforms_passed}", WHITE)
+    high_text = render_text(font, f"Рекорд: {max_platforms}", YELLOW)
+    coins_text = render_text(font, f"Монеты: {total_coins}", (255, 200, 100))
+    rects = [
+        surface.blit(score_surface, (10, 10)),
+        surface.blit(score_text, (20, 15)),
+        surface.blit(high_text, (20, 35)),
+        surface.blit(coins_text, (20, 55))
+    ]
+    # Индикатор двойной жизни (правый верхний угол) с детализированными крыльями
+    if double_life:
+        active = world.extra_life_available and not world.revive_active
+        icon, pos = life_icon(active, wing_frame_index(pygame.time.get_ticks()))
+        rects.append(surface.blit(icon, pos))
+    return rects
+
+
+class DirtyRectRenderer:
+    # Необязательный режим (--dirty-rects): фон восстанавливается только под
+    # прямоугольниками прошлого кадра, и на экран уходят старые и новые
+    # прямоугольники. Сдвиг камеры или внешняя перерисовка дают полный кадр.
+    def __init__(self):
+        self.previous = None
+        self.camera = None
+        self.full_frames = 0
+        self.partial_frames = 0
+
+    def invalidate(self):
+        self.previous = None
+
+    def stats(self):
+        return {"full": self.full_frames, "partial": self.partial_frames}
+
+    def present(self, surface, background, world, popup_font, profiler=None):
+        bounds = surface.get_rect()
+        cam = world.camera_offset
+        full = self.previous is None or cam != self.camera
+        if full:
+            surface.blit(background, (0, 0))
+        else:
+            for r in self.previous:
+                surface.blit(background, r, r)
+        if profiler is not None:
+            profiler.mark("background")
+        rects = draw_world(surface, world, popup_font)
+        if profiler is not None:
+            profiler.mark("draw")
+        rects += draw_hud(surface, world)
+        if profiler is not None:
+            rect = profiler.draw_overlay(surface)
+            if rect is not None:
+                rects.append(rect)
+            profiler.mark("hud")
+        # Пустые и вылезшие за экран прямоугольники отбрасываем: фон под
+        # ними восстанавливается блитом с той же областью источника
+        rects = [r.clip(bounds) for r in rects if r]
+        rects = [r for r in rects if r]
+        if full:
+            backend.present()
+            self.full_frames += 1
+        else:
+            backend.present(self.previous + rects)
+            self.partial_frames += 1
+        self.previous = rects
+        self.camera = cam
+        if profiler is not None:
+            profiler.mark("flip")
+
+
+class SoftwareBackend:
+    # Вывод через поверхность окна pygame.display: кадр рисуется прямо в screen
+    name = "software"
+
+    def __init__(self):
+        self.surface = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Pixel Hopper Pro")
+
+    def present(self, rects=None):
+        # Показать screen целиком или только прямоугольники rects
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+
+    def begin_frame(self):
+        # Поверхность, на которой рисуется кадр игры
+        return self.surface
+
+    def end_frame(self):
+        pygame.display.flip()
+
+    def freeze_frame(self, background, world, popup_font):
+        # Последний кадр игры уже лежит в screen, меню рисуют поверх него
+        pass
+
+    def translate_events(self, events):
+        return events
+
+    def mouse_pos(self):
+        return pygame.mouse.get_pos()
+
+
+class TextureCanvas:
+    # Цель кадра игры в текстурном выводе. Повторяет используемую часть Surface
+    # (blit, blits, get_size, get_rect), но вместо копирования пикселей рисует
+    # текстуры через Renderer. Картинка загружается в текстуру при первой
+    # встрече, ее прозрачность (set_alpha) применяется во время отрисовки,
+    # а поверхности из streaming_surfaces догружаются по рисуемой области.
+    def __init__(self, renderer, size):
+        self.renderer = renderer
+        self.size = size
+        # Поверхность -> (текстура, меняется ли на месте); умершие поверхности выпадают сами
+        self.textures = weakref.WeakKeyDictionary()
+
+    def get_size(self):
+        return self.size
+
+    def get_rect(self):
+        return pygame.Rect((0, 0), self.size)
+
+    def _texture(self, image):
+        entry = self.textures.get(image)
+        if entry is None:
+            streaming = image in streaming_surfaces
+            if streaming:
+                texture = sdl2_video.Texture(self.renderer, image.get_size(), streaming=True)
+            else:
+                texture = sdl2_video.Texture.from_surface(self.renderer, image)
+            # Непрозрачные картинки копируются без смешивания, пока им не задали set_alpha
+            opaque = not image.get_flags() & pygame.SRCALPHA
+            entry = self.textures[image] = (texture, streaming, opaque)
+        return entry
+
+    def blit(self, image, dest, area=None):
+        texture, streaming, opaque = self._texture(image)
+        alpha = image.get_alpha()
+        if opaque:
+            texture.blend_mode = pygame.BLENDMODE_NONE if alpha is None else pygame.BLENDMODE_BLEND
+        else:
+            texture.blend_mode = pygame.BLENDMODE_BLEND
+        texture.alpha = 255 if alpha is None else alpha
+        if area is None:
+            rect = pygame.Rect(dest[0], dest[1], *image.get_size())
+            if streaming:
+                texture.update(image)
+            texture.draw(dstrect=rect)
+        else:
+            area = pygame.Rect(area)
+            rect = pygame.Rect(dest[0], dest[1], area.width, area.height)
+            if streaming:
+                texture.update(image.subsurface(area), area)
+            texture.draw(srcrect=area, dstrect=rect)
+        return rect
+
+    def blits(self, blit_sequence, doreturn=True):
+        rects = [self.blit(image, dest) for image, dest in blit_sequence]
+        return rects if doreturn else None
+
+
+class TextureBackend:
+    # Вывод через pygame._sdl2.video: Renderer с логическим размером WIDTH x HEIGHT
+    # масштабирует кадр до окна любого размера без пересчета пикселей в Python.
+    # Кадр игры рисуется текстурами через TextureCanvas; меню по-прежнему рисуют
+    # на screen, и present() выводит его одной потоковой текстурой.
+    # Для проверки без видеокарты: SDL_RENDER_DRIVER=software.
+    name = "texture"
+
+    def __init__(self, scale=1):
+        if sdl2_video is None:
+            raise pygame.error("pygame собран без pygame._sdl2")
+        scale = max(1, scale)
+        # convert()/convert_alpha() требуют режима pygame.display: держим скрытое окно 1x1,
+        # а игра показывается в отдельном окне Renderer
+        pygame.display.set_mode((1, 1), pygame.HIDDEN)
+        self.window = sdl2_video.Window("Pixel Hopper Pro", size=(WIDTH * scale, HEIGHT * scale), resizable=True)
+        try:
+            self.renderer = sdl2_video.Renderer(self.window)
+        except Exception:
+            self.window.destroy()
+            raise
+        self.renderer.logical_size = (WIDTH, HEIGHT)
+        self.renderer.draw_color = (0, 0, 0, 255)
+        self.surface = pygame.Surface((WIDTH, HEIGHT)).convert()
+        self.screen_texture = sdl2_video.Texture(self.renderer, (WIDTH, HEIGHT), streaming=True)
+        self.canvas = TextureCanvas(self.renderer, (WIDTH, HEIGHT))
+
+    def present(self, rects=None):
+        # Меню меняются редко, поэтому screen загружается целиком
+        self.screen_texture.update(self.surface)
+        self.renderer.clear()
+        self.screen_texture.draw()
+        self.renderer.present()
+
+    def begin_frame(self):
+        self.renderer.clear()
+        return self.canvas
+
+    def end_frame(self):
+        self.renderer.present()
+
+    def freeze_frame(self, background, world, popup_font):
+        # Меню паузы и конца игры затемняют последний кадр в screen, а кадр
+        # был нарисован текстурами; собираем его на screen программно один раз
+        surface = self.surface
+        surface.blit(background, (0, 0))
+        draw_world(surface, world, popup_font, track=False)
+        draw_hud(surface, world)
+
+    def translate_events(self, events):
+        # Рядом со скрытым окном display окно игры не последнее, и SDL
+        # сообщает о его закрытии через WINDOWCLOSE вместо QUIT
+        return [pygame.event.Event(pygame.QUIT) if event.type == pygame.WINDOWCLOSE else event
+                for event in events]
+
+    def mouse_pos(self):
+        # События мыши SDL переводит в логические координаты сам, а
+        # pygame.mouse.get_pos() отдает пиксели окна
+        x, y = pygame.mouse.get_pos()
+        width, height = self.window.size
+        scale = min(width / WIDTH, height / HEIGHT)
+        return (int((x - (width - WIDTH * scale) / 2) / scale),
+                int((y - (height - HEIGHT * scale) / 2) / scale))
+
+
+# Фазы кадра в порядке выполнения; step() отмечает фазы от update до cull
+PROFILE_PHASES = ("events", "update", "collision", "coins", "scroll", "cull",
+                  "background", "draw", "hud", "flip")
+PROFILE_WINDOW = 600  # кадров в скользящем окне (~7 с при 90 FPS)
+PROFILE_OVERLAY_REFRESH = 30  # панель перерисовывается раз в столько кадров
+
+
+def cache_stats(renderer=None):
+    stats = {"pools": pool_stats(), "text_cache": text_cache.stats(), "assets": assets.stats(),
+             "saves": save_service.stats()}
+    if renderer is not None:
+        stats["dirty_rects"] = renderer.stats()
+    return stats
+
+
+def cache_stats_lines(renderer=None):
+    # Короткая сводка cache_stats() для панели F3: пулы — занято/свободно
+    stats = cache_stats(renderer)
+    pools = " ".join(f"{name[:4]} {s['active']}/{s['free']}" for name, s in stats["pools"].items())
+    text = stats["text_cache"]
+    lookups = text["hits"] + text["misses"]
+    hit_rate = 100 * text["hits"] // lookups if lookups else 0
+    images = stats["assets"]
+    lines = [
+        f"пулы: {pools}",
+        f"текст: {text['entries']} шт, попаданий {hit_rate}%",
+        f"картинки: {images['entries']} шт, {images['bytes'] // 1024} КБ",
+        f"сохранения: снимков {stats['saves']['snapshots']}, в журнал {stats['saves']['journal']}"
+    ]
+    if "dirty_rects" in stats:
+        frames = stats["dirty_rects"]
+        lines.append(f"кадры: полных {frames['full']}, частичных {frames['partial']}")
+    return lines
+
+
+class FrameProfiler:
+    # Время каждой фазы кадра в миллисекундах за последние PROFILE_WINDOW кадров.
+    # Панель с p50/p95/p99 включается по F3, итог можно выгрузить в CSV/JSON.
+    def __init__(self, window=PROFILE_WINDOW):
+        self.samples = {name: deque(maxlen=window) for name in PROFILE_PHASES + ("frame",)}
+        self.current = dict.fromkeys(PROFILE_PHASES, 0.0)
+        self.frame_start = 0.0
+        self.last_mark = 0.0
+        self.frames = 0
+        self.show_overlay = False
+        self.overlay = None
+        self.overlay_age = 0
+        # DirtyRectRenderer из main(): его счетчики кадров попадают в сводку
+        self.renderer = None
+
+    def begin_frame(self):
+        self.frame_start = self.last_mark = time.perf_counter()
+        current = self.current
+        for name in current:
+            current[name] = 0.0
+
+    def mark(self, phase):
+        # Время с прошлой отметки относим к фазе phase
+        now = time.perf_counter()
+        self.current[phase] += now - self.last_mark
+        self.last_mark = now
+
+    def end_frame(self):
+        samples = self.samples
+        for name, value in self.current.items():
+            samples[name].append(value * 1000.0)
+        samples["frame"].append((self.last_mark - self.frame_start) * 1000.0)
+        self.frames += 1
+
+    def percentiles(self, name):
+        values = sorted(self.samples[name])
+        if not values:
+            return 0.0, 0.0, 0.0
+        last = len(values) - 1
+        return tuple(values[int(round(q * last))] for q in (0.5, 0.95, 0.99))
+
+    def summary(self):
+        result = {}
+        for name, values in self.samples.items():
+            p50, p95, p99 = self.percentiles(name)
+            result[name] = {"p50": p50, "p95": p95, "p99": p99,
+                            "max": max(values) if values else 0.0}
+        return result
+
+    def toggle_overlay(self):
+        self.show_overlay = not self.show_overlay
+        self.overlay = None
+
+    def draw_overlay(self, surface):
+        if not self.show_overlay:
+            return None
+        # Текст меняется каждый кадр; обновляем панель реже, чтобы не забивать кэш текста
+        self.overlay_age -= 1
+        if self.overlay is None or self.overlay_age <= 0:
+            self.overlay = self._build_overlay()
+            self.overlay_age = PROFILE_OVERLAY_REFRESH
+        # Панель непрозрачная: при частичной перерисовке она просто перекрывает прошлую
+        return surface.blit(self.overlay, (10, HEIGHT - self.overlay.get_height() - 10))
+
+    def _build_overlay(self):
+        font = get_font(14)
+        names = ("frame",) + PROFILE_PHASES
+        line_height = font.get_linesize()
+        stats = cache_stats_lines(self.renderer)
+        panel = pygame.Surface((230, line_height * (len(names) + len(stats) + 1) + 8))
+        panel.fill((20, 20, 30))
+        # Шрифт не моноширинный, поэтому числа выравниваем по правым краям колонок
+        columns = (130, 175, 220)
+        header = (180, 180, 180)
+        panel.blit(font.render("мс", True, header), (6, 4))
+        for right, label in zip(columns, ("p50", "p95", "p99")):
+            text = font.render(label, True, header)
+            panel.blit(text, (right - text.get_width(), 4))
+        for i, name in enumerate(names):
+            y = 4 + line_height * (i + 1)
+            values = self.percentiles(name)
+            color = (255, 120, 120) if name == "frame" and values[1] > 1000.0 / FPS else WHITE
+            panel.blit(font.render(name, True, color), (6, y))
+            for right, value in zip(columns, values):
+                text = font.render(f"{value:.2f}", True, color)
+                panel.blit(text, (right - text.get_width(), y))
+        # Под фазами — состояние пулов и кэшей
+        for i, line in enumerate(stats):
+            y = 4 + line_height * (len(names) + i + 1)
+            panel.blit(font.render(line, True, header), (6, y))
+        return panel
+
+    def dump(self, path):
+        # .json — сводка и сырые замеры окна, иначе CSV: строка на кадр
+        path = Path(path)
+        names = ("frame",) + PROFILE_PHASES
+        try:
+            if path.suffix == ".json":
+                data = {"frames": self.frames, "summary": self.summary(), "caches": cache_stats(self.renderer),
+                        "samples": {name: list(self.samples[name]) for name in names}}
+                path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+            else:
+                rows = zip(*(self.samples[name] for name in names))
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(",".join(names) + "\n")
+                    for row in rows:
+                        f.write(",".join(f"{v:.4f}" for v in row) + "\n")
+        except OSError as e:
+            print(f"Ошибка записи профиля: {e}")
+
 
 def start_music():
     global music_loaded, current_music_index
@@ -634,56 +2250,269 @@ def toggle_sound():
         pygame.mixer.music.pause()
     save_game()
 
+def _save_checksum(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def _migrate_save_v1(raw):
+    # v1 — плоский JSON без версии и контрольной суммы
+    data = dict(SAVE_DEFAULTS)
+    data.update({key: raw[key] for key in SAVE_DEFAULTS if key in raw})
+    return {"version": 2, "generation": 0, "data": data, "checksum": _save_checksum(data)}
+
+
+# Цепочка миграций: версия -> функция, поднимающая сохранение на одну версию
+SAVE_MIGRATIONS = {
+    1: _migrate_save_v1,
+}
+
+
+def parse_save(raw):
+    # Приводит прочитанный снимок к SAVE_VERSION; ValueError, если он поврежден
+    if not isinstance(raw, dict):
+        raise ValueError("сохранение не является объектом")
+    version = raw.get("version", 1)
+    while version < SAVE_VERSION:
+        raw = SAVE_MIGRATIONS[version](raw)
+        version = raw["version"]
+    if version != SAVE_VERSION:
+        raise ValueError(f"неизвестная версия сохранения: {version}")
+    data = raw.get("data")
+    if not isinstance(data, dict) or raw.get("checksum") != _save_checksum(data):
+        raise ValueError("контрольная сумма сохранения не совпадает")
+    merged = dict(SAVE_DEFAULTS)
+    merged.update(data)
+    return merged, raw.get("generation", 0)
+
+
+def _journal_crc(base, delta):
+    return zlib.crc32(json.dumps([base, delta], sort_keys=True, separators=(",", ":")).encode("utf-8"))
+
+
+def read_journal(path, generation):
+    # Дельты, записанные поверх снимка этого поколения; чтение обрывается
+    # на первой поврежденной строке (запись прервана сбоем). Мусор в хвосте
+    # может быть и не UTF-8: такие байты заменяются, и строка не пройдет проверку
+    deltas = []
+    if not path.exists():
+        return deltas
+    with open(path, 'r', encoding="utf-8", errors="replace") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                if entry["crc"] != _journal_crc(entry["base"], entry["delta"]):
+                    break
+                if not isinstance(entry["delta"], dict):
+                    break
+            except (ValueError, KeyError, TypeError):
+                break
+            if entry["base"] == generation:
+                deltas.append(entry["delta"])
+    return deltas
+
+
+def quarantine_saves(paths):
+    # Поврежденные файлы не затираем, а откладываем в сторону для восстановления
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    for path in paths:
+        if path.exists():
+            os.replace(path, path.with_name(f"{path.name}.corrupt-{stamp}"))
+
+
+def read_save():
+    # Снимок (или резервная копия, если основной поврежден) плюс журнал дельт.
+    # Возвращает (data, generation) или None, если сохранений еще нет.
+    # Основной файл, не прошедший проверку, откладывается в сторону сразу:
+    # иначе следующая свертка переместила бы его поверх целой резервной копии
+    errors = []
+    failed = []
+    for path in (SAVE_FILE, SAVE_BACKUP_FILE):
+        if not path.exists():
+            continue
+        try:
+            with open(path, 'r', encoding="utf-8") as f:
+                data, generation = parse_save(json.load(f))
+        except Exception as e:
+            errors.append(f"{path.name}: {e}")
+            failed.append(path)
+            continue
+        if failed:
+            print(f"Ошибка загрузки: {'; '.join(errors)}; используется {path.name}")
+            quarantine_saves(failed)
+        # Журнал лишь дополняет снимок: его сбой не должен стоить снимка
+        try:
+            deltas = read_journal(JOURNAL_FILE, generation)
+        except OSError as e:
+            print(f"Ошибка чтения журнала: {e}")
+            deltas = []
+        for delta in deltas:
+            data.update(delta)
+        return data, generation
+    if errors:
+        raise ValueError("; ".join(errors))
+    return None
+
+
 def load_game():
     global high_score, sound_enabled, max_platforms, total_coins, current_skin, current_trail, purchased_skins, purchased_trails, double_coins, double_life
+    # Сначала дописываем отложенное сохранение, иначе прочитаем устаревший файл
+    save_service.flush()
     try:
-        if SAVE_FILE.exists():
-            with open(SAVE_FILE, 'r') as f:
-                data = json.load(f)
-                high_score = data.get("high_score", 0)
-                sound_enabled = data.get("sound_enabled", True)
-                max_platforms = data.get("max_platforms", 0)
-                total_coins = data.get("total_coins", 0)  # Load coins from save
-                purchased_skins = list(set(data.get("purchased_skins", [])).union({"default"}))
-                purchased_trails = list(set(data.get("purchased_trails", [])).union({"none"}))
-                current_skin = data.get("current_skin", "default")
-                current_trail = data.get("current_trail", "none")
-                double_coins = data.get("double_coins", False)
-                double_life = data.get("double_life", False)
-        else:
-            total_coins = 0  # Default to 0 if no save file exists
-            save_game()
+        loaded = read_save()
     except Exception as e:
         print(f"Ошибка загрузки: {e}")
-        total_coins = 0
-        purchased_skins = ["default"]
-        purchased_trails = ["none"]
-        current_skin = "default"
-        current_trail = "none"
+        quarantine_saves((SAVE_FILE, SAVE_BACKUP_FILE, JOURNAL_FILE))
+        loaded = None
+    if loaded is None:
+        data, generation = dict(SAVE_DEFAULTS), 0
+    else:
+        data, generation = loaded
+    high_score = data["high_score"]
+    sound_enabled = data["sound_enabled"]
+    max_platforms = data["max_platforms"]
+    total_coins = data["total_coins"]
+    purchased_skins = list(set(data["purchased_skins"]).union({"default"}))
+    purchased_trails = list(set(data["purchased_trails"]).union({"none"}))
+    current_skin = data["current_skin"]
+    current_trail = data["current_trail"]
+    double_coins = data["double_coins"]
+    double_life = data["double_life"]
+    save_service.reset(data if loaded is not None else None, generation)
+    if loaded is None:
         save_game()
+    elif save_service.journal_entries:
+        # Сворачиваем журнал сразу: после оборванной строки новые дельты не прочитались бы
+        flush_saves(compact=True)
+
+class SaveService:
+    # Сохранение вне кадра: save_game() только кладет снимок данных,
+    # фоновый поток пишет не чаще min_interval, объединяя промежуточные снимки.
+    # Обычно в журнал дописывается строка с изменившимися полями; раз в
+    # JOURNAL_COMPACT_ENTRIES записей (и при выходе) журнал сворачивается в
+    # снимок, который пишется атомарно: временный файл + os.replace.
+    def __init__(self, path, journal_path, backup_path, min_interval=SAVE_INTERVAL):
+        self.path = path
+        self.journal_path = journal_path
+        self.backup_path = backup_path
+        self.min_interval = min_interval
+        self.cond = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.pending = None
+        self.last_write = 0.0
+        self.thread = None
+        self.persisted = None  # состояние на диске (снимок + журнал)
+        self.generation = 0
+        self.journal_entries = 0
+        self.writes = 0
+        self.journal_writes = 0
+
+    def stats(self):
+        return {"snapshots": self.writes, "journal": self.journal_writes, "generation": self.generation}
+
+    def reset(self, data, generation):
+        # Вызывается после загрузки: дельты считаются от прочитанного состояния
+        with self.write_lock:
+            self.persisted = dict(data) if data is not None else None
+            self.generation = generation
+            # Считаем все строки журнала, включая поврежденный хвост: он тоже повод для свертки
+            self.journal_entries = 0
+            if self.journal_path.exists():
+                with open(self.journal_path, 'r', encoding="utf-8", errors="replace") as f:
+                    self.journal_entries = sum(1 for _ in f)
+
+    def request(self, data):
+        with self.cond:
+            self.pending = data
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="save-service", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.pending is None:
+                    self.cond.wait()
+                delay = self.last_write + self.min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.flush()
+
+    def flush(self, compact=False):
+        # Синхронно записывает отложенный снимок (пауза, конец игры, выход)
+        with self.write_lock:
+            with self.cond:
+                data = self.pending
+                self.pending = None
+            if data is None:
+                data = self.persisted
+                if data is None or not (compact and self.journal_entries):
+                    return
+            try:
+                if self.persisted is None or compact or self.journal_entries >= JOURNAL_COMPACT_ENTRIES:
+                    self._write_snapshot(data)
+                else:
+                    delta = {key: value for key, value in data.items() if self.persisted.get(key) != value}
+                    if delta:
+                        self._append_journal(delta)
+                self.persisted = dict(data)
+            except Exception as e:
+                print(f"Ошибка сохранения: {e}")
+            self.last_write = time.monotonic()
+
+    def _append_journal(self, delta):
+        entry = {"base": self.generation, "delta": delta, "crc": _journal_crc(self.generation, delta)}
+        with open(self.journal_path, 'a', encoding="utf-8") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_entries += 1
+        self.journal_writes += 1
+
+    def _write_snapshot(self, data):
+        generation = self.generation + 1
+        snapshot = {"version": SAVE_VERSION, "generation": generation, "data": data, "checksum": _save_checksum(data)}
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w', encoding="utf-8") as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        # Прежний снимок остается резервной копией: вместе с журналом он
+        # восстанавливает состояние, если сбой случится между заменами
+        if self.path.exists():
+            os.replace(self.path, self.backup_path)
+        os.replace(tmp_path, self.path)
+        self.generation = generation
+        self.journal_entries = 0
+        # Старые дельты относятся к прошлому поколению и при чтении пропускаются
+        open(self.journal_path, 'w').close()
+        self.writes += 1
+
+
+save_service = SaveService(SAVE_FILE, JOURNAL_FILE, SAVE_BACKUP_FILE)
+
 
 def save_game():
     global high_score, sound_enabled, max_platforms, total_coins, current_skin, current_trail, purchased_skins, purchased_trails, double_coins, double_life
-    try:
-        data = {
-            "high_score": high_score,
-            "sound_enabled": sound_enabled,
-            "max_platforms": max_platforms,
-            "total_coins": total_coins,
-            "current_skin": current_skin,
-            "current_trail": current_trail,
-            "purchased_skins": purchased_skins,
-            "purchased_trails": purchased_trails,
-            "double_coins": double_coins,
-            "double_life": double_life
-        }
-        with open(SAVE_FILE, 'w') as f:
-            json.dump(data, f)
-    except Exception as e:
-        print(f"Ошибка сохранения: {e}")
+    save_service.request({
+        "high_score": high_score,
+        "sound_enabled": sound_enabled,
+        "max_platforms": max_platforms,
+        "total_coins": total_coins,
+        "current_skin": current_skin,
+        "current_trail": current_trail,
+        "purchased_skins": list(purchased_skins),
+        "purchased_trails": list(purchased_trails),
+        "double_coins": double_coins,
+        "double_life": double_life
+    })
+
+def flush_saves(compact=False):
+    save_service.flush(compact)
 
 def save_on_exit():
     save_game()
+    flush_saves(compact=True)
 
 atexit.register(save_on_exit)
 
@@ -703,45 +2532,82 @@ def reset_game_state():
     if sound_enabled and not pygame.mixer.music.get_busy():
         start_music()
 
+# Меню не крутят clock.tick: ждут события, а тайм-аут лишь будит цикл
+MENU_IDLE_TIMEOUT_MS = 500
+_menu_layers = {}
+
+
+def wait_events(timeout=MENU_IDLE_TIMEOUT_MS):
+    event = pygame.event.wait(timeout)
+    if event.type == pygame.NOEVENT:
+        return []
+    return backend.translate_events([event] + pygame.event.get())
+
+
+def needs_redraw(event):
+    # Окно было перекрыто или восстановлено — кадр нужно вывести заново
+    return event.type in (pygame.VIDEOEXPOSE, getattr(pygame, "WINDOWEXPOSED", pygame.VIDEOEXPOSE))
+
+
+def menu_background(path, fallback, shade):
+    # Фон меню с уже наложенным затемнением, собирается один раз на процесс
+    key = (path, shade)
+    layer = _menu_layers.get(key)
+    if layer is None:
+        layer = assets.get(path, (WIDTH, HEIGHT), fallback=fallback).copy()
+        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, shade))
+        layer.blit(overlay, (0, 0))
+        _menu_layers[key] = layer
+    return layer
+
+
+def draw_button(surface, rect, color, text, radius=10):
+    pygame.draw.rect(surface, color, rect, border_radius=radius)
+    pygame.draw.rect(surface, (40, 40, 40), rect, 2, border_radius=radius)
+    surface.blit(text, (rect.centerx - text.get_width() // 2,
+                        rect.centery - text.get_height() // 2))
+
+
 def show_game_over(screen):
     global high_score, max_platforms, platforms_passed, total_coins
     if platforms_passed > max_platforms:
         max_platforms = platforms_passed
         save_game()
+    flush_saves()
     overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
     overlay.fill((0, 0, 0, 180))
     screen.blit(overlay, (0, 0))
-    font = pygame.font.SysFont("Arial", 36, bold=True)
-    small_font = pygame.font.SysFont("Arial", 24, bold=True)
-    text = font.render("КОНЕЦ ИГРЫ", True, (255, 50, 50))
-    platforms_text = font.render(f"Платформы: {platforms_passed}", True, WHITE)
-    record_text = font.render(f"Рекорд: {max_platforms}", True, YELLOW)
-    coins_text = font.render(f"Всего монет: {total_coins}", True, (255, 200, 100))
+    font = get_font(36, bold=True)
+    small_font = get_font(24, bold=True)
+    text = render_text(font, "КОНЕЦ ИГРЫ", (255, 50, 50))
+    platforms_text = render_text(font, f"Платформы: {platforms_passed}", WHITE)
+    record_text = render_text(font, f"Рекорд: {max_platforms}", YELLOW)
+    coins_text = render_text(font, f"Всего монет: {total_coins}", (255, 200, 100))
     restart_button = pygame.Rect(WIDTH//2 - 150, HEIGHT//2 + 80, 120, 40)
     pygame.draw.rect(screen, (70, 200, 70), restart_button, border_radius=5)
     pygame.draw.rect(screen, (40, 40, 40), restart_button, 2, border_radius=5)
-    restart_text = small_font.render("Заново", True, BLACK)
+    restart_text = render_text(small_font, "Заново", BLACK)
     screen.blit(restart_text, (restart_button.centerx - restart_text.get_width()//2,
                               restart_button.centery - restart_text.get_height()//2))
     menu_button = pygame.Rect(WIDTH//2 + 30, HEIGHT//2 + 80, 120, 40)
     pygame.draw.rect(screen, (200, 70, 70), menu_button, border_radius=5)
     pygame.draw.rect(screen, (40, 40, 40), menu_button, 2, border_radius=5)
-    menu_text = small_font.render("Меню", True, BLACK)
+    menu_text = render_text(small_font, "Меню", BLACK)
     screen.blit(menu_text, (menu_button.centerx - menu_text.get_width()//2,
                            menu_button.centery - menu_text.get_height()//2))
     screen.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT//2 - 120))
     screen.blit(platforms_text, (WIDTH//2 - platforms_text.get_width()//2, HEIGHT//2 - 60))
     screen.blit(record_text, (WIDTH//2 - record_text.get_width()//2, HEIGHT//2 - 20))
     screen.blit(coins_text, (WIDTH//2 - coins_text.get_width()//2, HEIGHT//2 + 20))
-    pygame.display.flip()
-    waiting = True
-    while waiting:
-        for event in pygame.event.get():
+    backend.present()
+    while True:
+        for event in wait_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 return "quit"
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                mouse_pos = pygame.mouse.get_pos()
+                mouse_pos = backend.mouse_pos()
                 if restart_button.collidepoint(mouse_pos):
                     return "restart"
                 elif menu_button.collidepoint(mouse_pos):
@@ -753,20 +2619,34 @@ def show_game_over(screen):
                     return "menu"
             if event.type == MUSIC_END_EVENT:
                 play_next_track()
-        clock.tick(FPS)
+            if needs_redraw(event):
+                backend.present()
 
 def show_pause_menu(screen):
+    flush_saves()
     overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
     overlay.fill((0, 0, 0, 180))
-    title_font = pygame.font.SysFont("Arial", 48, bold=True)
-    button_font = pygame.font.SysFont("Arial", 32, bold=True)
+    title_font = get_font(48, bold=True)
+    button_font = get_font(32, bold=True)
 
-    title = title_font.render("ПАУЗА", True, (200, 220, 255))
+    title = render_text(title_font, "ПАУЗА", (200, 220, 255))
     resume_button = pygame.Rect(WIDTH // 2 - 150, HEIGHT // 2 - 20, 300, 50)
     menu_button = pygame.Rect(WIDTH // 2 - 150, HEIGHT // 2 + 60, 300, 50)
 
+    # Затемнение накладываем на застывший кадр один раз, а не каждый цикл
+    frame = screen.copy()
+    frame.blit(overlay, (0, 0))
+    frame.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 2 - 120))
+    draw_button(frame, resume_button, (70, 200, 70), render_text(button_font, "Продолжить", BLACK))
+    draw_button(frame, menu_button, (200, 70, 70), render_text(button_font, "Меню", BLACK))
+    redraw = True
+
     while True:
-        for event in pygame.event.get():
+        if redraw:
+            screen.blit(frame, (0, 0))
+            backend.present()
+            redraw = False
+        for event in wait_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 return "quit"
@@ -774,107 +2654,88 @@ def show_pause_menu(screen):
                 if event.key in (pygame.K_p, pygame.K_ESCAPE):
                     return "resume"
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                mouse_pos = pygame.mouse.get_pos()
+                mouse_pos = backend.mouse_pos()
                 if resume_button.collidepoint(mouse_pos):
                     return "resume"
                 if menu_button.collidepoint(mouse_pos):
                     return "menu"
             if event.type == MUSIC_END_EVENT:
                 play_next_track()
-        screen.blit(overlay, (0, 0))
-        screen.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 2 - 120))
-        pygame.draw.rect(screen, (70, 200, 70), resume_button, border_radius=10)
-        pygame.draw.rect(screen, (40, 40, 40), resume_button, 2, border_radius=10)
-        resume_text = button_font.render("Продолжить", True, BLACK)
-        screen.blit(resume_text, (resume_button.centerx - resume_text.get_width() // 2,
-                                  resume_button.centery - resume_text.get_height() // 2))
-        pygame.draw.rect(screen, (200, 70, 70), menu_button, border_radius=10)
-        pygame.draw.rect(screen, (40, 40, 40), menu_button, 2, border_radius=10)
-        menu_text = button_font.render("Меню", True, BLACK)
-        screen.blit(menu_text, (menu_button.centerx - menu_text.get_width() // 2,
-                                menu_button.centery - menu_text.get_height() // 2))
-        pygame.display.flip()
-        clock.tick(FPS)
+            if needs_redraw(event):
+                redraw = True
 
 
 def show_shop_screen(screen, shop_type):
     global current_skin, current_trail, total_coins, purchased_skins, purchased_trails
     skins = ["default", "ninja", "robot", "zombie"]
-    try:
-        shop_bg = pygame.image.load("store_background.jpg")
-        shop_bg = pygame.transform.scale(shop_bg, (WIDTH, HEIGHT))
-    except:
-        shop_bg = pygame.Surface((WIDTH, HEIGHT))
-        shop_bg.fill((50, 50, 70))
     shop_title = "Магазин скинов" if shop_type == "skins" else "Магазин следов"
     items = skins if shop_type == "skins" else trails
     purchased_items = purchased_skins if shop_type == "skins" else purchased_trails
     max_visible_items = 3
     scroll_index = 0
-    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 100))
-    font = pygame.font.SysFont("Arial", 36, bold=True)
-    item_font = pygame.font.SysFont("Arial", 24, bold=True)
+    font = get_font(36, bold=True)
+    item_font = get_font(24, bold=True)
     up_button = pygame.Rect(WIDTH - 45, 185, 40, 40)
     down_button = pygame.Rect(WIDTH - 45, HEIGHT - 145, 40, 40)
     back_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT - 80, 200, 50)
+    # Неизменная часть экрана: фон, затемнение, заголовок, стрелки и «Назад»
+    static = menu_background("store_background.jpg", (50, 50, 70), 100).copy()
+    title_text = render_text(font, shop_title, WHITE)
+    static.blit(title_text, (WIDTH // 2 - title_text.get_width() // 2, 50))
+    pygame.draw.rect(static, (100, 100, 255), up_button, border_radius=5)
+    pygame.draw.rect(static, (100, 100, 255), down_button, border_radius=5)
+    pygame.draw.polygon(static, WHITE, [
+        (up_button.centerx - 10, up_button.centery + 5),
+        (up_button.centerx + 10, up_button.centery + 5),
+        (up_button.centerx, up_button.centery - 10)
+    ])
+    pygame.draw.polygon(static, WHITE, [
+        (down_button.centerx - 10, down_button.centery - 5),
+        (down_button.centerx + 10, down_button.centery - 5),
+        (down_button.centerx, down_button.centery + 10)
+    ])
+    draw_button(static, back_button, (200, 70, 70), render_text(font, "Назад", WHITE))
+    redraw = True
     while True:
-        screen.blit(shop_bg, (0, 0))
-        screen.blit(overlay, (0, 0))
-        title_text = font.render(shop_title, True, WHITE)
-        screen.blit(title_text, (WIDTH // 2 - title_text.get_width() // 2, 50))
-        coins_text = font.render(f"Монеты: {total_coins}", True, YELLOW)
-        screen.blit(coins_text, (WIDTH // 2 - coins_text.get_width() // 2, 100))
-        item_buttons = []
-        visible_items = items[scroll_index:scroll_index + max_visible_items]
-        for i, item in enumerate(visible_items):
-            button_y = 180 + i * 120
-            button_rect = pygame.Rect(WIDTH // 2 - 150, button_y, 300, 80)
-            if (shop_type == "skins" and item == current_skin) or (shop_type == "trails" and item == current_trail):
-                color = (200, 225, 255)
-            elif item in purchased_items:
-                color = (70, 70, 200)
-            else:
-                color = (100, 100, 100)
-            pygame.draw.rect(screen, color, button_rect, border_radius=10)
-            pygame.draw.rect(screen, (40, 40, 40), button_rect, 2, border_radius=10)
-            item_text = item_font.render(display_name(item), True, WHITE)
-            screen.blit(item_text, (button_rect.centerx - item_text.get_width() // 2,
-                                   button_rect.centery - item_text.get_height() // 2))
-            price = 0 if item in ["none", "default"] else (1000 if item == "rainbow" else 500)
-            if item in purchased_items:
-                status_text = item_font.render("Куплено", True, GREEN)
-            elif price > total_coins:
-                status_text = item_font.render(f"{price} монет", True, (255, 100, 100))
-            else:
-                status_text = item_font.render(f"{price} монет", True, YELLOW)
-            screen.blit(status_text, (button_rect.centerx - status_text.get_width() // 2,
-                                     button_rect.centery + 10))
-            item_buttons.append((button_rect, item, price))
-        pygame.draw.rect(screen, (100, 100, 255), up_button, border_radius=5)
-        pygame.draw.rect(screen, (100, 100, 255), down_button, border_radius=5)
-        pygame.draw.polygon(screen, WHITE, [
-            (up_button.centerx - 10, up_button.centery + 5),
-            (up_button.centerx + 10, up_button.centery + 5),
-            (up_button.centerx, up_button.centery - 10)
-        ])
-        pygame.draw.polygon(screen, WHITE, [
-            (down_button.centerx - 10, down_button.centery - 5),
-            (down_button.centerx + 10, down_button.centery - 5),
-            (down_button.centerx, down_button.centery + 10)
-        ])
-        pygame.draw.rect(screen, (200, 70, 70), back_button, border_radius=10)
-        pygame.draw.rect(screen, (40, 40, 40), back_button, 2, border_radius=10)
-        back_text = font.render("Назад", True, WHITE)
-        screen.blit(back_text, (back_button.centerx - back_text.get_width() // 2,
-                               back_button.centery - back_text.get_height() // 2))
-        pygame.display.flip()
-        for event in pygame.event.get():
+        if redraw:
+            # Перерисовываем только после покупки, выбора или прокрутки
+            screen.blit(static, (0, 0))
+            coins_text = render_text(font, f"Монеты: {total_coins}", YELLOW)
+            screen.blit(coins_text, (WIDTH // 2 - coins_text.get_width() // 2, 100))
+            item_buttons = []
+            visible_items = items[scroll_index:scroll_index + max_visible_items]
+            for i, item in enumerate(visible_items):
+                button_y = 180 + i * 120
+                button_rect = pygame.Rect(WIDTH // 2 - 150, button_y, 300, 80)
+                if (shop_type == "skins" and item == current_skin) or (shop_type == "trails" and item == current_trail):
+                    color = (200, 225, 255)
+                elif item in purchased_items:
+                    color = (70, 70, 200)
+                else:
+                    color = (100, 100, 100)
+                pygame.draw.rect(screen, color, button_rect, border_radius=10)
+                pygame.draw.rect(screen, (40, 40, 40), button_rect, 2, border_radius=10)
+                item_text = render_text(item_font, display_name(item), WHITE)
+                screen.blit(item_text, (button_rect.centerx - item_text.get_width() // 2,
+                                       button_rect.centery - item_text.get_height() // 2))
+                price = 0 if item in ["none", "default"] else (1000 if item == "rainbow" else 500)
+                if item in purchased_items:
+                    status_text = render_text(item_font, "Куплено", GREEN)
+                elif price > total_coins:
+                    status_text = render_text(item_font, f"{price} монет", (255, 100, 100))
+                else:
+                    status_text = render_text(item_font, f"{price} монет", YELLOW)
+                screen.blit(status_text, (button_rect.centerx - status_text.get_width() // 2,
+                                         button_rect.centery + 10))
+                item_buttons.append((button_rect, item, price))
+            backend.present()
+            redraw = False
+        for event in wait_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 return "quit"
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                mouse_pos = pygame.mouse.get_pos()
+                mouse_pos = backend.mouse_pos()
                 for button_rect, item, price in item_buttons:
                     if button_rect.collidepoint(mouse_pos):
                         if item in purchased_items:
@@ -894,37 +2755,35 @@ def show_shop_screen(screen, shop_type):
                                     purchased_trails.append(item)
                                 current_trail = item
                             save_game()
+                        redraw = True
                 if up_button.collidepoint(mouse_pos) and scroll_index > 0:
                     scroll_index -= 1
+                    redraw = True
                 if down_button.collidepoint(mouse_pos) and scroll_index < len(items) - max_visible_items:
                     scroll_index += 1
+                    redraw = True
                 if back_button.collidepoint(mouse_pos):
                     return "menu"
             if event.type == pygame.MOUSEWHEEL:
                 if event.y > 0 and scroll_index > 0:
                     scroll_index -= 1
+                    redraw = True
                 elif event.y < 0 and scroll_index < len(items) - max_visible_items:
                     scroll_index += 1
+                    redraw = True
             if event.type == MUSIC_END_EVENT:
                 play_next_track()
-        clock.tick(FPS)
+            if needs_redraw(event):
+                redraw = True
     return "menu"
 
 def show_upgrades_shop(screen):
     global total_coins, double_coins, double_life
-    try:
-        shop_bg = pygame.image.load("store_background.jpg")
-        shop_bg = pygame.transform.scale(shop_bg, (WIDTH, HEIGHT))
-    except:
-        shop_bg = pygame.Surface((WIDTH, HEIGHT))
-        shop_bg.fill((50, 50, 70))
-    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 100))
-    title_font = pygame.font.SysFont("Arial", 36, bold=True)
-    item_font = pygame.font.SysFont("Arial", 24, bold=True)
-    price_font = pygame.font.SysFont("Arial", 24, bold=True)
+    title_font = get_font(36, bold=True)
+    item_font = get_font(24, bold=True)
+    price_font = get_font(24, bold=True)
 
-    title_text = title_font.render("Магазин усилений", True, WHITE)
+    title_text = render_text(title_font, "Магазин усилений", WHITE)
 
     back_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT - 80, 200, 50)
 
@@ -935,187 +2794,161 @@ def show_upgrades_shop(screen):
     life_price = 1500
     life_rect = pygame.Rect(WIDTH // 2 - 150, 320, 300, 80)
 
+    # Неизменная часть экрана: фон, затемнение, заголовок и «Назад»
+    static = menu_background("store_background.jpg", (50, 50, 70), 100).copy()
+    static.blit(title_text, (WIDTH // 2 - title_text.get_width() // 2, 60))
+    draw_button(static, back_button, (200, 70, 70), render_text(title_font, "Назад", WHITE))
+    redraw = True
+
     while True:
-        screen.blit(shop_bg, (0, 0))
-        screen.blit(overlay, (0, 0))
-        screen.blit(title_text, (WIDTH // 2 - title_text.get_width() // 2, 60))
-        coins_text = title_font.render(f"Монеты: {total_coins}", True, YELLOW)
-        screen.blit(coins_text, (WIDTH // 2 - coins_text.get_width() // 2, 110))
-
-        # x2 монеты
-        if double_coins:
-            color = (200, 225, 255)
-        elif total_coins >= coins_price:
-            color = (70, 70, 200)
-        else:
-            color = (100, 100, 100)
-        pygame.draw.rect(screen, color, coins_rect, border_radius=10)
-        pygame.draw.rect(screen, (40, 40, 40), coins_rect, 2, border_radius=10)
-        name_text = item_font.render("x2 монеты", True, WHITE)
-        screen.blit(name_text, (coins_rect.centerx - name_text.get_width() // 2,
-                                coins_rect.centery - name_text.get_height()))
-        if double_coins:
-            status_text = item_font.render("Куплено", True, (150, 200, 255))
-        else:
-            status_color = YELLOW if total_coins >= coins_price else (255, 100, 100)
-            status_text = price_font.render(f"{coins_price} монет", True, status_color)
-        screen.blit(status_text, (coins_rect.centerx - status_text.get_width() // 2,
-                                  coins_rect.centery))
-
-        # 2 жизнь
-        if double_life:
-            color = (200, 225, 255)
-        elif total_coins >= life_price:
-            color = (70, 70, 200)
-        else:
-            color = (100, 100, 100)
-        pygame.draw.rect(screen, color, life_rect, border_radius=10)
-        pygame.draw.rect(screen, (40, 40, 40), life_rect, 2, border_radius=10)
-        life_name = item_font.render("2 жизнь", True, WHITE)
-        screen.blit(life_name, (life_rect.centerx - life_name.get_width() // 2,
-                                life_rect.centery - life_name.get_height()))
-        if double_life:
-            life_status = item_font.render("Куплено", True, (150, 200, 255))
-        else:
-            life_color = YELLOW if total_coins >= life_price else (255, 100, 100)
-            life_status = price_font.render(f"{life_price} монет", True, life_color)
-        screen.blit(life_status, (life_rect.centerx - life_status.get_width() // 2,
-                                  life_rect.centery))
-
-        # Назад
-        pygame.draw.rect(screen, (200, 70, 70), back_button, border_radius=10)
-        pygame.draw.rect(screen, (40, 40, 40), back_button, 2, border_radius=10)
-        back_text = title_font.render("Назад", True, WHITE)
-        screen.blit(back_text, (back_button.centerx - back_text.get_width() // 2,
-                                back_button.centery - back_text.get_height() // 2))
+        if redraw:
+            screen.blit(static, (0, 0))
+            coins_text = render_text(title_font, f"Монеты: {total_coins}", YELLOW)
+            screen.blit(coins_text, (WIDTH // 2 - coins_text.get_width() // 2, 110))
 
-        pygame.display.flip()
+            # x2 монеты
+            if double_coins:
+                color = (200, 225, 255)
+            elif total_coins >= coins_price:
+                color = (70, 70, 200)
+            else:
+                color = (100, 100, 100)
+            pygame.draw.rect(screen, color, coins_rect, border_radius=10)
+            pygame.draw.rect(screen, (40, 40, 40), coins_rect, 2, border_radius=10)
+            name_text = render_text(item_font, "x2 монеты", WHITE)
+            screen.blit(name_text, (coins_rect.centerx - name_text.get_width() // 2,
+                                    coins_rect.centery - name_text.get_height()))
+            if double_coins:
+                status_text = render_text(item_font, "Куплено", (150, 200, 255))
+            else:
+                status_color = YELLOW if total_coins >= coins_price else (255, 100, 100)
+                status_text = render_text(price_font, f"{coins_price} монет", status_color)
+            screen.blit(status_text, (coins_rect.centerx - status_text.get_width() // 2,
+                                      coins_rect.centery))
 
-        for event in pygame.event.get():
+            # 2 жизнь
+            if double_life:
+                color = (200, 225, 255)
+            elif total_coins >= life_price:
+                color = (70, 70, 200)
+            else:
+                color = (100, 100, 100)
+            pygame.draw.rect(screen, color, life_rect, border_radius=10)
+            pygame.draw.rect(screen, (40, 40, 40), life_rect, 2, border_radius=10)
+            life_name = render_text(item_font, "2 жизнь", WHITE)
+            screen.blit(life_name, (life_rect.centerx - life_name.get_width() // 2,
+                                    life_rect.centery - life_name.get_height()))
+            if double_life:
+                life_status = render_text(item_font, "Куплено", (150, 200, 255))
+            else:
+                life_color = YELLOW if total_coins >= life_price else (255, 100, 100)
+                life_status = render_text(price_font, f"{life_price} монет", life_color)
+            screen.blit(life_status, (life_rect.centerx - life_status.get_width() // 2,
+                                      life_rect.centery))
+
+            backend.present()
+            redraw = False
+
+        for event in wait_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 return "quit"
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                mouse_pos = pygame.mouse.get_pos()
+                mouse_pos = backend.mouse_pos()
                 if back_button.collidepoint(mouse_pos):
                     return "menu"
                 if coins_rect.collidepoint(mouse_pos) and not double_coins and total_coins >= coins_price:
                     total_coins -= coins_price
                     double_coins = True
                     save_game()
+                    redraw = True
                 if life_rect.collidepoint(mouse_pos) and not double_life and total_coins >= life_price:
                     total_coins -= life_price
                     double_life = True
                     save_game()
+                    redraw = True
             if event.type == MUSIC_END_EVENT:
                 play_next_track()
-        clock.tick(FPS)
+            if needs_redraw(event):
+                redraw = True
 
 
 def show_loading_screen():
     global sound_enabled, high_score, max_platforms, total_coins
     load_game()
-    try:
-        bg_image = pygame.image.load("background_home_screen.jpg")
-        bg_image = pygame.transform.scale(bg_image, (WIDTH, HEIGHT))
-    except:
-        bg_image = pygame.Surface((WIDTH, HEIGHT))
-        bg_image.fill((30, 30, 50))
     load_music()
-    title_font = pygame.font.SysFont("Arial", 48, bold=True)
-    instruction_font = pygame.font.SysFont("Arial", 24)
-    button_font = pygame.font.SysFont("Arial", 32, bold=True)
-    stats_font = pygame.font.SysFont("Arial", 20)
-    title_text = title_font.render("PIXEL HOPPER", True, (100, 255, 100))
-    controls_text1 = instruction_font.render("Управление:", True, WHITE)
-    controls_text2 = instruction_font.render("← → или A D - Движение", True, WHITE)
-    controls_text3 = instruction_font.render("ПРОБЕЛ - Прыжок", True, WHITE)
-    controls_text4 = instruction_font.render("ESC — Пауза", True, WHITE)
-    stats_text1 = stats_font.render(f"Рекорд: {max_platforms}", True, (200, 200, 255))
-    stats_text2 = stats_font.render(f"Монеты: {total_coins}", True, (255, 255, 100))
+    title_font = get_font(48, bold=True)
+    instruction_font = get_font(24)
+    button_font = get_font(32, bold=True)
+    stats_font = get_font(20)
+    title_text = render_text(title_font, "PIXEL HOPPER", (100, 255, 100))
+    controls_text1 = render_text(instruction_font, "Управление:", WHITE)
+    controls_text2 = render_text(instruction_font, "← → или A D - Движение", WHITE)
+    controls_text3 = render_text(instruction_font, "ПРОБЕЛ - Прыжок", WHITE)
+    controls_text4 = render_text(instruction_font, "ESC — Пауза", WHITE)
     start_button = pygame.Rect(WIDTH//2 - 100, HEIGHT//2 + 10, 200, 50)
     start_color = (70, 200, 70)
     start_hover_color = (100, 255, 100)
-    start_text = button_font.render("СТАРТ", True, BLACK)
+    start_text = render_text(button_font, "СТАРТ", BLACK)
     skins_button = pygame.Rect(WIDTH//2 - 100, HEIGHT//2 + 80, 200, 50)
     skins_color = (200, 100, 200)
     skins_hover_color = (255, 150, 255)
-    skins_text = button_font.render("Скины", True, BLACK)
+    skins_text = render_text(button_font, "Скины", BLACK)
     trails_button = pygame.Rect(WIDTH//2 - 100, HEIGHT//2 + 150, 200, 50)
     trails_color = (100, 200, 200)
     trails_hover_color = (150, 255, 255)
-    trails_text = button_font.render("Следы", True, BLACK)
+    trails_text = render_text(button_font, "Следы", BLACK)
 
     upgrades_button = pygame.Rect(WIDTH//2 - 100, HEIGHT//2 + 220, 200, 50)
     upgrades_color = (200, 170, 100)
     upgrades_hover_color = (255, 210, 150)
-    upgrades_text = button_font.render("Усиления", True, BLACK)
+    upgrades_text = render_text(button_font, "Усиления", BLACK)
     sound_button_size = 40
     sound_button_rect = pygame.Rect(WIDTH - sound_button_size - 10, 10, sound_button_size, sound_button_size)
+    # Неизменная часть экрана: фон, затемнение, заголовок и подсказки
+    static = menu_background("background_home_screen.jpg", (30, 30, 50), 128).copy()
+    static.blit(title_text, (WIDTH//2 - title_text.get_width()//2, HEIGHT//5 - 30))
+    static.blit(controls_text1, (WIDTH//2 - controls_text1.get_width()//2, HEIGHT//2 - 130))
+    static.blit(controls_text2, (WIDTH//2 - controls_text2.get_width()//2, HEIGHT//2 - 100))
+    static.blit(controls_text3, (WIDTH//2 - controls_text3.get_width()//2, HEIGHT//2 - 70))
+    static.blit(controls_text4, (WIDTH//2 - controls_text4.get_width()//2, HEIGHT//2 - 40))
+    shown_state = None
     loading = True
     while loading:
-        mouse_pos = pygame.mouse.get_pos()
         mouse_clicked = False
-        for event in pygame.event.get():
+        for event in wait_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 mouse_clicked = True
-                if sound_button_rect.collidepoint(mouse_pos):
+                if sound_button_rect.collidepoint(event.pos):
                     toggle_sound()
             if event.type == MUSIC_END_EVENT:
                 play_next_track()
-        screen.blit(bg_image, (0, 0))
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 128))
-        screen.blit(overlay, (0, 0))
-        stats_text1 = stats_font.render(f"Рекорд: {max_platforms}", True, (200, 200, 255))
-        stats_text2 = stats_font.render(f"Монеты: {total_coins}", True, (255, 255, 100))
-        screen.blit(stats_text1, (20, 20))
-        screen.blit(stats_text2, (20, 45))
-        screen.blit(title_text, (WIDTH//2 - title_text.get_width()//2, HEIGHT//5 - 30))
-        screen.blit(controls_text1, (WIDTH//2 - controls_text1.get_width()//2, HEIGHT//2 - 130))
-        screen.blit(controls_text2, (WIDTH//2 - controls_text2.get_width()//2, HEIGHT//2 - 100))
-        screen.blit(controls_text3, (WIDTH//2 - controls_text3.get_width()//2, HEIGHT//2 - 70))
-        screen.blit(controls_text4, (WIDTH//2 - controls_text4.get_width()//2, HEIGHT//2 - 40))
+            if needs_redraw(event):
+                shown_state = None
+        mouse_pos = backend.mouse_pos()
         start_hovered = start_button.collidepoint(mouse_pos)
-        pygame.draw.rect(screen, start_hover_color if start_hovered else start_color, start_button, border_radius=10)
-        pygame.draw.rect(screen, (40, 40, 40), start_button, 2, border_radius=10)
-        screen.blit(start_text, (start_button.centerx - start_text.get_width()//2,
-                               start_button.centery - start_text.get_height()//2))
         skins_hovered = skins_button.collidepoint(mouse_pos)
-        pygame.draw.rect(screen, skins_hover_color if skins_hovered else skins_color, skins_button, border_radius=10)
-        pygame.draw.rect(screen, (40, 40, 40), skins_button, 2, border_radius=10)
-        screen.blit(skins_text, (skins_button.centerx - skins_text.get_width()//2,
-                               skins_button.centery - skins_text.get_height()//2))
         trails_hovered = trails_button.collidepoint(mouse_pos)
-        pygame.draw.rect(screen, trails_hover_color if trails_hovered else trails_color, trails_button, border_radius=10)
-        pygame.draw.rect(screen, (40, 40, 40), trails_button, 2, border_radius=10)
-        screen.blit(trails_text, (trails_button.centerx - trails_text.get_width()//2,
-                                trails_button.centery - trails_text.get_height()//2))
-
         upgrades_hovered = upgrades_button.collidepoint(mouse_pos)
-        pygame.draw.rect(screen, upgrades_hover_color if upgrades_hovered else upgrades_color, upgrades_button, border_radius=10)
-        pygame.draw.rect(screen, (40, 40, 40), upgrades_button, 2, border_radius=10)
-        screen.blit(upgrades_text, (upgrades_button.centerx - upgrades_text.get_width()//2,
-                                  upgrades_button.centery - upgrades_text.get_height()//2))
         sound_button_hovered = sound_button_rect.collidepoint(mouse_pos)
-        pygame.draw.rect(screen, (100, 100, 255) if sound_button_hovered else (70, 70, 200), sound_button_rect, border_radius=10)
-        if sound_enabled:
-            pygame.draw.polygon(screen, WHITE, [
-                (sound_button_rect.left + 10, sound_button_rect.centery - 7),
-                (sound_button_rect.left + 17, sound_button_rect.centery - 7),
-                (sound_button_rect.left + 25, sound_button_rect.centery - 15),
-                (sound_button_rect.left + 25, sound_button_rect.centery + 15),
-                (sound_button_rect.left + 17, sound_button_rect.centery + 7),
-                (sound_button_rect.left + 10, sound_button_rect.centery + 7)
-            ])
-            for i in range(3):
-                start_x = sound_button_rect.left + 28 + i*3
-                height = 8 + i*4
-                pygame.draw.arc(screen, WHITE, (start_x, sound_button_rect.centery - height//2, 5, height), -0.7, 0.7, 2)
-        else:
+        # Кадр меняется только при наведении, переключении звука или новых цифрах
+        state = (start_hovered, skins_hovered, trails_hovered, upgrades_hovered,
+                 sound_button_hovered, sound_enabled, max_platforms, total_coins)
+        if state != shown_state:
+            shown_state = state
+            screen.blit(static, (0, 0))
+            stats_text1 = render_text(stats_font, f"Рекорд: {max_platforms}", (200, 200, 255))
+            stats_text2 = render_text(stats_font, f"Монеты: {total_coins}", (255, 255, 100))
+            screen.blit(stats_text1, (20, 20))
+            screen.blit(stats_text2, (20, 45))
+            draw_button(screen, start_button, start_hover_color if start_hovered else start_color, start_text)
+            draw_button(screen, skins_button, skins_hover_color if skins_hovered else skins_color, skins_text)
+            draw_button(screen, trails_button, trails_hover_color if trails_hovered else trails_color, trails_text)
+            draw_button(screen, upgrades_button, upgrades_hover_color if upgrades_hovered else upgrades_color, upgrades_text)
+            pygame.draw.rect(screen, (100, 100, 255) if sound_button_hovered else (70, 70, 200), sound_button_rect, border_radius=10)
             pygame.draw.polygon(screen, WHITE, [
                 (sound_button_rect.left + 10, sound_button_rect.centery - 7),
                 (sound_button_rect.left + 17, sound_button_rect.centery - 7),
@@ -1124,34 +2957,39 @@ def show_loading_screen():
                 (sound_button_rect.left + 17, sound_button_rect.centery + 7),
                 (sound_button_rect.left + 10, sound_button_rect.centery + 7)
             ])
-            pygame.draw.line(screen, (255, 70, 70), (sound_button_rect.left + 30, sound_button_rect.top + 10),
-                           (sound_button_rect.left + 10, sound_button_rect.bottom - 10), 3)
+            if sound_enabled:
+                for i in range(3):
+                    start_x = sound_button_rect.left + 28 + i*3
+                    height = 8 + i*4
+                    pygame.draw.arc(screen, WHITE, (start_x, sound_button_rect.centery - height//2, 5, height), -0.7, 0.7, 2)
+            else:
+                pygame.draw.line(screen, (255, 70, 70), (sound_button_rect.left + 30, sound_button_rect.top + 10),
+                               (sound_button_rect.left + 10, sound_button_rect.bottom - 10), 3)
+            backend.present()
         if mouse_clicked:
             if start_hovered:
                 loading = False
-            elif skins_hovered:
-                result = show_shop_screen(screen, "skins")
-                load_game()
-                if result == "quit":
-                    pygame.quit()
-                    sys.exit()
-            elif trails_hovered:
-                result = show_shop_screen(screen, "trails")
-                load_game()
-                if result == "quit":
-                    pygame.quit()
-                    sys.exit()
-            elif upgrades_hovered:
-                result = show_upgrades_shop(screen)
+            elif skins_hovered or trails_hovered or upgrades_hovered:
+                if upgrades_hovered:
+                    result = show_upgrades_shop(screen)
+                else:
+                    result = show_shop_screen(screen, "skins" if skins_hovered else "trails")
                 load_game()
                 if result == "quit":
                     pygame.quit()
                     sys.exit()
-        pygame.display.flip()
-        clock.tick(60)
-
-def main():
-    global current_score, high_score, is_transitioning, transition_alpha, next_bg, current_bg_index, coins, platforms_passed, max_platforms, total_coins, helicopters, lift_active, lift_remaining, helicopter_carry
+                # Магазин рисовал поверх меню
+                shown_state = None
+
+def main(dirty_rects=False, profile_path=None, renderer_name="software", scale=1):
+    global is_transitioning, transition_alpha
+    setup_window(renderer_name, scale)
+    # Текстурный вывод перерисовывает кадр целиком, частичное обновление ему не нужно
+    renderer = DirtyRectRenderer() if dirty_rects and backend.name == "software" else None
+    profiler = FrameProfiler()
+    profiler.renderer = renderer
+    if profile_path:
+        atexit.register(profiler.dump, profile_path)
     assets_dir = Path(__file__).parent / "assets"
     if not assets_dir.exists():
         assets_dir.mkdir()
@@ -1161,319 +2999,135 @@ def main():
         show_loading_screen()
         reset_game_state()
         current_background = load_background(0)
-        player = Player()
-        popup_font = pygame.font.SysFont("Arial", 20, bold=True)
-        coins.clear()
-        helicopters.clear()
-        floating_texts.clear()
-        platforms = generate_platforms(HEIGHT - 50, 10)
-        camera_offset = 0
-        lift_scroll_accum = 0.0
-        extra_life_available = double_life
-        revive_active = False
-        revive_frames = 0
-        if platforms:
-            player.rect.bottom = platforms[0].rect.top
-            player.on_ground = True
-            player.initial_jump_available = True
+        world = GameWorld(record=True)
+        world.profiler = profiler
+        popup_font = get_font(20, bold=True)
         running = True
         while running:
-            current_time = time.time()
-            world_scroll = 0
-            for event in pygame.event.get():
+            profiler.begin_frame()
+            jump_pressed = False
+            for event in backend.translate_events(pygame.event.get()):
                 if event.type == pygame.QUIT:
+                    finish_replay(world)
                     pygame.quit()
                     return
                 if event.type == pygame.KEYDOWN:
                     if event.key in (pygame.K_SPACE, pygame.K_UP, pygame.K_w):
-                        player.jump()
+                        jump_pressed = True
+                    elif event.key == pygame.K_F3:
+                        profiler.toggle_overlay()
                     elif event.key == pygame.K_p or event.key == pygame.K_ESCAPE:
+                        backend.freeze_frame(current_background, world, popup_font)
                         pause_res = show_pause_menu(screen)
+                        if renderer is not None:
+                            renderer.invalidate()
+                        # Время в меню паузы к кадру не относится
+                        profiler.begin_frame()
                         if pause_res == "menu":
+                            finish_replay(world)
+                            world.release_entities()
                             running = False
                             break
                         elif pause_res == "quit":
+                            finish_replay(world)
                             pygame.quit()
                             return
                 if event.type == MUSIC_END_EVENT:
                     play_next_track()
+            if not running:
+                break
             keys = pygame.key.get_pressed()
-            player.velocity_x = 0
-            if keys[pygame.K_LEFT] or keys[pygame.K_a]:
-                player.velocity_x = -PLAYER_SPEED
-            if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-                player.velocity_x = PLAYER_SPEED
-            # Управление вертолетом по горизонтали во время полета
-            if lift_active and helicopter_carry:
-                dx = 0
-                if keys[pygame.K_LEFT] or keys[pygame.K_a]:
-                    dx -= HELI_HORIZONTAL_SPEED
-                if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-                    dx += HELI_HORIZONTAL_SPEED
-                helicopter_carry.rect.x = max(0, min(WIDTH - helicopter_carry.WIDTH, helicopter_carry.rect.x + dx))
-                player.rect.centerx = helicopter_carry.rect.centerx
-
-            player.update()
-            for h in helicopters:
-                h.update()
-            if player.rect.top > HEIGHT:
-                if extra_life_available and not revive_active:
-                    # Активируем вторую жизнь: крылья поднимают игрока
-                    extra_life_available = False
-                    revive_active = True
-                    revive_frames = int(FPS * 1.5)
-                    player.rect.bottom = HEIGHT - 10
-                    player.velocity_y = INITIAL_JUMP_VELOCITY * 1.5
-                    # не показываем экран конца игры, продолжаем
-                else:
-                    result = show_game_over(screen)
-                    if result == "restart":
-                        reset_game_state()
-                        current_background = load_background(0)
-                        player = Player()
-                        coins.clear()
-                        helicopters.clear()
-                        floating_texts.clear()
-                        platforms = generate_platforms(HEIGHT - 50, 10)
-                        camera_offset = 0
-                        extra_life_available = double_life
-                        revive_active = False
-                        revive_frames = 0
-                        if platforms:
-                            player.rect.bottom = platforms[0].rect.top
-                            player.on_ground = True
-                            player.initial_jump_available = True
-                        continue
-                    elif result == "menu":
-                        running = False
-                        break
-                    else:
-                        pygame.quit()
-                        return
-            player.on_ground = False
-            if not lift_active:
-                for platform in platforms[:]:
-                    if (player.rect.colliderect(platform.rect) and
-                            player.velocity_y > 0 and
-                            player.old_y + PLAYER_SIZE <= platform.rect.top):
-                        player.rect.bottom = platform.rect.top
-                        player.velocity_y = 0
-                        player.on_ground = True
-                        if platform.type == "spring":
-                            player.velocity_y = INITIAL_JUMP_VELOCITY * 1.5
-                            platform.compress_spring()
-                            player.on_ground = False
-                        elif platform.type == "disappearing" and not platform.activated:
-                            platform.activated = True
-                            platform.disappear_time = current_time
-            
-            # Захват вертолета
-            for h in helicopters:
-                if (not lift_active) and (not getattr(h, 'vanishing', False)) and player.rect.colliderect(h.rect):
-                    lift_active = True
-                    lift_remaining = random.randint(20, 45) * PLATFORM_GAP
-                    helicopter_carry = h
-                    h.used = True
-                    player.velocity_y = 0
-                    player.on_ground = True
+            inputs = FrameInput(
+                left=keys[pygame.K_LEFT] or keys[pygame.K_a],
+                right=keys[pygame.K_RIGHT] or keys[pygame.K_d],
+                jump=jump_pressed
+            )
+            profiler.mark("events")
+            world.step(inputs)
+            player = world.player
+            if world.jumped:
+                player.check_background_transition()
+            if world.game_over:
+                finish_replay(world)
+                backend.freeze_frame(current_background, world, popup_font)
+                result = show_game_over(screen)
+                world.release_entities()
+                if result == "restart":
+                    reset_game_state()
+                    current_background = load_background(0)
+                    world = GameWorld(record=True)
+                    world.profiler = profiler
+                    if renderer is not None:
+                        renderer.invalidate()
+                    continue
+                elif result == "menu":
+                    running = False
                     break
-            
-            # Удаляем дублирующий подсчет платформ и остав��яем только этот блок
-            for platform in platforms:
-                if not platform.counted and player.rect.bottom < platform.rect.top:
-                    platforms_passed += 1
-                    platform.counted = True
-                    if platforms_passed > max_platforms:
-                        max_platforms = platforms_passed
-                        save_game()
-            
-            platforms = [p for p in platforms if not p.should_disappear()]
-            
-            for coin in coins[:]:
-                coin.update()
-                if player.rect.colliderect(coin.rect):
-                    player.add_score(coin.value)
-                    gain = coin.value * (2 if double_coins else 1)
-                    floating_texts.append(FloatingText(coin.rect.x, coin.rect.y, f"+{gain}", (255, 220, 80)))
-                    coins.remove(coin)
-            
-            # Обновление всплывающих текстов
-            for ft in floating_texts[:]:
-                ft.update()
-                if ft.life <= 0:
-                    floating_texts.remove(ft)
-            # Анимация крыльев второй жизни
-            if revive_active:
-                revive_frames -= 1
-                player.rect.y -= 1.2
-                if revive_frames <= 0:
-                    revive_active = False
-            # Перемещение при подъеме на вертолете: вертолет действительно летит, камера подключается позже
-            if lift_active and helicopter_carry:
-                player.velocity_y = 0
-                # Пока вертолет ниже 1/3 экрана — подн��маем сам вертолет
-                if helicopter_carry.rect.top > HEIGHT // 3:
-                    helicopter_carry.rect.y -= LIFT_SPEED
-                    player.rect.bottom = helicopter_carry.rect.top
-                    lift_remaining -= LIFT_SPEED
-                    if not helicopter_carry.vanishing and lift_remaining <= HELI_BLINK_BEFORE_VANISH_SEC * HELI_SCROLL_PX_PER_SEC:
-                        helicopter_carry.blink = True
-                    # Завершение полета (вертолет ниже 1/3 экрана)
-                    if lift_remaining <= 0:
-                        try:
-                            helicopters.remove(helicopter_carry)
-                        except ValueError:
-                            pass
-                        lift_active = False
-                        helicopter_carry = None
-                        player.on_ground = False
-                        player.velocity_y = INITIAL_JUMP_VELOCITY * 1.5
                 else:
-                    # Держим вертолет на 1/3 экрана, двигаем мир вниз равномерными целыми шагами
-                    lift_scroll_accum += LIFT_SPEED
-                    offset = int(lift_scroll_accum)
-                    player.rect.bottom = helicopter_carry.rect.top
-                    if offset > 0:
-                        lift_scroll_accum -= offset
-                        camera_offset += offset
-                        world_scroll += offset
-                        for platform in platforms:
-                            platform.rect.y += offset
-                        for coin in coins:
-                            coin.rect.y += offset
-                        for h in helicopters:
-                            if h is not helicopter_carry:
-                                h.rect.y += offset
-                        for point in player.trail_points:
-                            point['y'] += offset
-                        for ft in floating_texts:
-                            ft.y += offset
-                        lift_remaining -= offset
-                    # Включить мигание за 3 секунды до исчезновения
-                    if not helicopter_carry.vanishing and lift_remaining <= HELI_BLINK_BEFORE_VANISH_SEC * HELI_SCROLL_PX_PER_SEC:
-                        helicopter_carry.blink = True
-                    # Завершение полета (когда вертолет на 1/3 экрана)
-                    if lift_remaining <= 0:
-                        try:
-                            helicopters.remove(helicopter_carry)
-                        except ValueError:
-                            pass
-                        lift_active = False
-                        helicopter_carry = None
-                        player.on_ground = False
-                        player.velocity_y = INITIAL_JUMP_VELOCITY * 1.5
-            
-            if not lift_active and player.rect.top < HEIGHT // 3:
-                offset = HEIGHT // 3 - player.rect.top
-                camera_offset += offset
-                world_scroll += offset
-                player.rect.y += offset
-                for platform in platforms:
-                    platform.rect.y += offset
-                for coin in coins:
-                    coin.rect.y += offset
-                for h in helicopters:
-                    h.rect.y += offset
-                for point in player.trail_points:
-                    point['y'] += offset
-                for ft in floating_texts:
-                    ft.y += offset
-            
-            # Декремент TTL вертолетов по прокрутке мира
-            if world_scroll > 0:
-                for h in helicopters:
-                    if (not h.used) and (not h.vanishing):
-                        h.lifetime_px -= world_scroll
-                        if (not h.blink) and h.lifetime_px <= HELI_BLINK_BEFORE_VANISH_SEC * HELI_SCROLL_PX_PER_SEC:
-                            h.blink = True
-                        if h.lifetime_px <= 0:
-                            h.vanishing = True
-                            h.vanish_frames = 12
-                            h.vanish_dy = -3
-            # Удаляем платформы и вертолеты, которые вышли за пределы экрана или завершили анимацию исчезновения
-            platforms = [p for p in platforms if p.rect.top <= HEIGHT]
-            # Принудительно запускаем исчезновение вертолетов у нижней кромки, если игрок их не подобрал
-            for h in helicopters:
-                if (not h.used) and (not getattr(h, 'vanishing', False)) and h.rect.bottom >= HEIGHT - 8:
-                    h.vanishing = True
-                    h.vanish_frames = 12
-                    h.vanish_dy = -3
-            helicopters = [h for h in helicopters if (h.rect.top <= HEIGHT) and (not getattr(h, 'dead', False)) and (h.used or h.rect.bottom < HEIGHT - 4)]
-            
-            if platforms:
-                highest_platform = min(p.rect.y for p in platforms)
-                while highest_platform > 0:
-                    new_y = highest_platform - PLATFORM_GAP
-                    new_x = random.randint(0, WIDTH - PLATFORM_WIDTH)
-                    new_platform = Platform(new_x, new_y)
-                    new_platform.counted = False
-                    platforms.append(new_platform)
-                    heli_spawned = False
-                    if new_platform.type == "normal" and random.random() < HELICOPTER_CHANCE:
-                        helicopters.append(Helicopter(new_platform))
-                        heli_spawned = True
-                    if (not heli_spawned) and random.random() < 0.4:
-                        coin_type = "blue" if random.random() < 0.15 else "yellow"
-                        coins.append(Coin(new_x + PLATFORM_WIDTH//2 - COIN_SIZE//2, new_y - COIN_SIZE - 5, coin_type))
-                    highest_platform = new_y
-            
+                    pygame.quit()
+                    return
+
+            if renderer is not None and not is_transitioning:
+                renderer.present(screen, current_background, world, popup_font, profiler)
+                profiler.end_frame()
+                clock.tick(FPS)
+                continue
+            target = backend.begin_frame()
             if is_transitioning:
-                screen.blit(current_background, (0, 0))
+                target.blit(current_background, (0, 0))
                 next_bg.set_alpha(transition_alpha)
-                screen.blit(next_bg, (0, 0))
+                target.blit(next_bg, (0, 0))
                 transition_alpha += 5
                 if transition_alpha >= 255:
                     is_transitioning = False
                     current_background = next_bg
+                    current_background.set_alpha(None)
             else:
-                screen.blit(current_background, (0, 0))
-            
-            for platform in platforms:
-                platform.draw(screen)
-            for coin in coins:
-                coin.draw(screen)
-            for h in helicopters:
-                h.draw(screen)
-            for ft in floating_texts:
-                ft.draw(screen, popup_font)
-            # Крылья вокруг игрока при второй жизни (детализированные)
-            if revive_active:
-                ticks = pygame.time.get_ticks()
-                phase = (ticks % 1000) / 1000.0 * 2 * math.pi
-                left_center = (player.rect.left - 6, player.rect.centery)
-                right_center = (player.rect.right + 6, player.rect.centery)
-                draw_wings_detailed(screen, left_center, right_center, scale=1.0, phase=phase, active=True)
-            player.draw(screen)
-            
-            score_surface = pygame.Surface((250, 80), pygame.SRCALPHA)
-            pygame.draw.rect(score_surface, (0, 0, 0, 150), (0, 0, 250, 80), border_radius=5)
-            font = pygame.font.SysFont("Arial", 24, bold=True)
-            score_text = font.render(f"Платформы: {platforms_passed}", True, WHITE)
-            high_text = font.render(f"Рекорд: {max_platforms}", True, YELLOW)
-            coins_text = font.render(f"Монеты: {total_coins}", True, (255, 200, 100))
-            screen.blit(score_surface, (10, 10))
-            screen.blit(score_text, (20, 15))
-            screen.blit(high_text, (20, 35))
-            screen.blit(coins_text, (20, 55))
-            # Индикатор двойной жизни (правый верхний угол) с детализированными крыльями
-            if double_life:
-                icon_rect = pygame.Rect(WIDTH - 36, 8, 26, 26)
-                bg_col = (80, 140, 200) if extra_life_available and not revive_active else (80, 80, 80)
-                pygame.draw.rect(screen, bg_col, icon_rect, border_radius=6)
-                cx = icon_rect.centerx
-                cy = icon_rect.centery
-                # мини-крылья детализированные
-                ticks = pygame.time.get_ticks()
-                phase = (ticks % 1000) / 1000.0 * 2 * math.pi
-                left_center = (cx - 6, cy)
-                right_center = (cx + 6, cy)
-                draw_wings_detailed(screen, left_center, right_center, scale=0.5, phase=phase, active=extra_life_available and not revive_active)
-                two = pygame.font.SysFont("Arial", 12, bold=True).render("2", True, BLACK)
-                screen.blit(two, (cx - two.get_width()//2, cy - two.get_height()//2))
-            
-            pygame.display.flip()
+                target.blit(current_background, (0, 0))
+            profiler.mark("background")
+
+            draw_world(target, world, popup_font, track=False)
+            profiler.mark("draw")
+            draw_hud(target, world)
+            profiler.draw_overlay(target)
+            profiler.mark("hud")
+            backend.end_frame()
+            profiler.mark("flip")
+            profiler.end_frame()
+            if renderer is not None:
+                # После смены фона следующий кадр рисуется целиком
+                renderer.invalidate()
             clock.tick(FPS)
 
+def run_replay(path, verify=False):
+    replay = Replay.load(path)
+    start = time.perf_counter()
+    world = replay.play()
+    try:
+        elapsed = time.perf_counter() - start
+        print(f"Кадров: {world.frame} за {elapsed:.2f} с, платформы: {world.platforms_passed}, монеты: {world.coins_earned}")
+        if not verify:
+            return 0
+        mismatches = replay.verify(world)
+    finally:
+        world.release_entities()
+    for key, expected, actual in mismatches:
+        print(f"Расхождение {key}: ожидалось {expected}, получено {actual}")
+    print("Повтор совпал" if not mismatches else "Повтор НЕ совпал")
+    return 1 if mismatches else 0
+
 if __name__ == "__main__":
     import sys
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Pixel Hopper Pro")
+    parser.add_argument("--replay", help="проиграть запись забега без окна")
+    parser.add_argument("--verify", action="store_true", help="сверить итог повтора с записанным")
+    parser.add_argument("--dirty-rects", action="store_true", help="обновлять только изменившиеся области экрана")
+    parser.add_argument("--profile", metavar="FILE", help="при выходе записать время фаз кадра (.csv или .json)")
+    parser.add_argument("--renderer", choices=RENDERERS, default="software",
+                        help="вывод кадров: software — поверхность окна, texture — текстуры pygame._sdl2")
+    parser.add_argument("--scale", type=int, default=1, help="во сколько раз увеличить окно (только для texture)")
+    args = parser.parse_args()
+    if args.replay:
+        sys.exit(run_replay(args.replay, args.verify))
+    main(dirty_rects=args.dirty_rects, profile_path=args.profile, renderer_name=args.renderer, scale=args.scale)
@@ -0,0 +1,65 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Сохранения пишутся в домашний каталог: подменяем его до импорта игры
+HOME = tempfile.mkdtemp()
+os.environ["HOME"] = HOME
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main_pk as game
+
+
+def write_snapshot(path, generation, coins):
+    data = dict(game.SAVE_DEFAULTS)
+    data["total_coins"] = coins
+    snapshot = {"version": game.SAVE_VERSION, "generation": generation, "data": data, "checksum": game._save_checksum(data)}
+    path.write_text(json.dumps(snapshot), encoding="utf-8")
+
+
+def journal_line(base, delta):
+    entry = {"base": base, "delta": delta, "crc": game._journal_crc(base, delta)}
+    return (json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class SaveRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        for path in game.SAVE_DIR.iterdir():
+            if path.is_file():
+                path.unlink()
+
+    def corrupt_files(self):
+        return sorted(path.name for path in game.SAVE_DIR.iterdir() if ".corrupt-" in path.name)
+
+    def test_torn_journal_tail_keeps_snapshot(self):
+        write_snapshot(game.SAVE_FILE, 1, 700)
+        # Хвост журнала оборван посреди записи и содержит байты не из UTF-8
+        game.JOURNAL_FILE.write_bytes(journal_line(1, {"total_coins": 778}) + b'{"base":1,"de\xff\xfe')
+        game.load_game()
+        self.assertEqual(game.total_coins, 778)
+        self.assertEqual(self.corrupt_files(), [])
+
+    def test_corrupt_main_is_quarantined_before_backup_is_used(self):
+        write_snapshot(game.SAVE_BACKUP_FILE, 1, 500)
+        game.SAVE_FILE.write_text('{"version": 2, "data": {"total_coins": 9', encoding="utf-8")
+        game.JOURNAL_FILE.write_bytes(journal_line(2, {"total_coins": 600}))
+        game.load_game()
+        self.assertEqual(game.total_coins, 500)
+        self.assertEqual([name.split(".corrupt-")[0] for name in self.corrupt_files()], [game.SAVE_FILE.name])
+        # Свертка журнала не должна затереть целую резервную копию поврежденным файлом
+        game.total_coins = 510
+        game.save_game()
+        game.save_service.flush(compact=True)
+        data, generation = game.parse_save(json.loads(game.SAVE_FILE.read_text(encoding="utf-8")))
+        self.assertEqual(data["total_coins"], 510)
+        data, generation = game.parse_save(json.loads(game.SAVE_BACKUP_FILE.read_text(encoding="utf-8")))
+        self.assertEqual(data["total_coins"], 500)
+
+
+if __name__ == "__main__":
+    unittest.main()